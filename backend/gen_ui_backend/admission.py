@@ -0,0 +1,125 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque
+
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from gen_ui_backend.metrics import METRICS
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted, with the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Limits how many graph runs execute at once in this process.
+
+    Up to `max_concurrency` requests run, up to `max_queue` more wait in FIFO
+    order for at most `queue_timeout` seconds. Anything beyond that is rejected
+    right away (429), and requests that wait too long are rejected with 503.
+    All state is touched from the event loop thread only, so no locking is needed.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def _update_gauges(self) -> None:
+        METRICS.set_gauge("admission_in_flight", self.in_flight)
+        METRICS.set_gauge("admission_queue_depth", len(self._waiters))
+
+    async def acquire(self) -> None:
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            METRICS.inc("admission_admitted_total")
+            self._update_gauges()
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            METRICS.inc("admission_rejected_total")
+            METRICS.inc("admission_rejected_total.queue_full")
+            raise AdmissionRejected(429, "Too many requests, the server is at capacity.", self.retry_after)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        queued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            # Keep the slot if it was handed over just as the wait timed out
+            if waiter.cancelled() or not waiter.done():
+                METRICS.inc("admission_rejected_total")
+                METRICS.inc("admission_rejected_total.queue_timeout")
+                raise AdmissionRejected(503, "The server is busy, timed out waiting for capacity.", self.retry_after)
+        except asyncio.CancelledError:
+            # The client went away, pass on a slot that was already handed over
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._update_gauges()
+
+        METRICS.inc("admission_admitted_total")
+        METRICS.inc("admission_queue_wait_ms_total", (time.perf_counter() - queued_at) * 1000)
+
+    def release(self) -> None:
+        # Hand the slot to the oldest waiter still waiting, otherwise free it
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self.in_flight -= 1
+        self._update_gauges()
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying an `AdmissionController` to POST requests under `path_prefix`.
+
+    The slot is held until the response body has been fully sent, which matters
+    for the streaming endpoints.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController, path_prefix: str = "/chat"):
+        self.app = app
+        self.controller = controller
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire()
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                {"detail": e.detail},
+                status_code=e.status_code,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
@@ -0,0 +1,215 @@
+"""
+Compressed archive of completed chat sessions.
+
+Archived sessions are appended to `segment-<n>.jsonl.gz` files in ARCHIVE_DIR,
+one gzip member per session, so each segment is also a plain gzip file of JSON
+lines. `index.jsonl` records the segment, offset and length of every member,
+which lets any archived session be read back with a single seek. `index.gen` holds
+a generation number that changes whenever the index is created or rewritten.
+
+A new segment is started once the current one reaches ARCHIVE_SEGMENT_BYTES.
+After each write, the oldest segments are deleted while the archive is larger
+than ARCHIVE_MAX_BYTES or older than ARCHIVE_RETENTION_DAYS, and their entries
+are dropped from the index.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from gen_ui_backend.config import (
+    ARCHIVE_DIR,
+    ARCHIVE_MAX_BYTES,
+    ARCHIVE_RETENTION_DAYS,
+    ARCHIVE_SEGMENT_BYTES,
+    get_store,
+)
+from gen_ui_backend.metrics import METRICS
+
+INDEX_FILE = "index.jsonl"
+INDEX_GENERATION_FILE = "index.gen"
+SEGMENT_PATTERN = re.compile(r"^segment-(\d+)\.jsonl\.gz$")
+
+# Store lock serializing archive writes between worker processes
+ARCHIVE_LOCK_KEY = "archive/index.jsonl"
+
+# Index entries per session ID, and the (generation, byte offset) of the index file read so far
+_index: Dict[str, List[dict]] = {}
+_index_cursor: Optional[Tuple[int, int]] = None
+_index_lock = threading.Lock()
+
+
+def _segment_path(number: int) -> Path:
+    return ARCHIVE_DIR / f"segment-{number:06d}.jsonl.gz"
+
+
+def _segments() -> List[Tuple[int, Path]]:
+    """Segment numbers and paths, oldest first."""
+    if not ARCHIVE_DIR.exists():
+        return []
+    segments = []
+    for path in ARCHIVE_DIR.iterdir():
+        match = SEGMENT_PATTERN.match(path.name)
+        if match:
+            segments.append((int(match.group(1)), path))
+    return sorted(segments)
+
+
+def _index_generation() -> int:
+    """Generation of the index file, 0 if it has none yet."""
+    try:
+        return int((ARCHIVE_DIR / INDEX_GENERATION_FILE).read_text())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _new_index_generation() -> None:
+    """Give the index a new generation. Must hold the archive lock, after the index is (re)created."""
+    generation = max(time.time_ns(), _index_generation() + 1)
+    path = ARCHIVE_DIR / INDEX_GENERATION_FILE
+    tmp_path = path.with_suffix(".gen.tmp")
+    _write_durably(tmp_path, str(generation).encode(), mode="wb")
+    os.replace(tmp_path, path)
+
+
+def _session_entries(session_id: str) -> List[dict]:
+    """
+    Return the index entries of a session, oldest first. Only the index lines
+    written since the last call are read, unless the index was rewritten.
+    """
+    global _index_cursor
+    with _index_lock:
+        while True:
+            generation = _index_generation()
+            try:
+                file = open(ARCHIVE_DIR / INDEX_FILE, "rb")
+            except FileNotFoundError:
+                _index.clear()
+                _index_cursor = None
+                return []
+            with file:
+                if _index_cursor is not None and _index_cursor[0] == generation:
+                    start = _index_cursor[1]
+                else:
+                    _index.clear()
+                    start = 0
+                file.seek(start)
+                data = file.read()
+            # The index was rewritten while it was read, read it again
+            if _index_generation() == generation:
+                break
+            _index_cursor = None
+        # A line still being written by another process is read next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                _index.setdefault(entry["session_id"], []).append(entry)
+        _index_cursor = (generation, start + end)
+        return list(_index.get(session_id, ()))
+
+
+def _write_durably(path: Path, data: bytes, mode: str = "ab") -> int:
+    """Write `data` to `path` and fsync it. Returns the offset it was written at."""
+    with open(path, mode) as file:
+        offset = file.seek(0, os.SEEK_END)
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    return offset
+
+
+def _prune(current_segment: int) -> None:
+    """Delete the oldest segments beyond the retention limits. Must hold the archive lock."""
+    segments = [(number, path, path.stat()) for number, path in _segments()]
+    total_bytes = sum(stat.st_size for _, _, stat in segments)
+    cutoff = time.time() - ARCHIVE_RETENTION_DAYS * 86400 if ARCHIVE_RETENTION_DAYS > 0 else None
+
+    removed = set()
+    for number, path, stat in segments:
+        if number == current_segment:
+            break
+        if total_bytes <= ARCHIVE_MAX_BYTES and (cutoff is None or stat.st_mtime >= cutoff):
+            break
+        path.unlink()
+        total_bytes -= stat.st_size
+        removed.add(number)
+    if not removed:
+        return
+
+    # Rewrite the index without the deleted segments. Readers notice the new generation.
+    index_path = ARCHIVE_DIR / INDEX_FILE
+    with open(index_path, "rb") as file:
+        lines = [line for line in file if line.strip() and json.loads(line)["segment"] not in removed]
+    tmp_path = index_path.with_suffix(".tmp")
+    _write_durably(tmp_path, b"".join(lines), mode="wb")
+    os.replace(tmp_path, index_path)
+    _new_index_generation()
+    METRICS.inc("archive_segments_pruned_total", len(removed))
+
+
+def archive_session(session_id: str, rows: List[List[str]]) -> dict:
+    """
+    Append the history rows (role, content) of a completed session to the
+    archive and return its index entry.
+    """
+    archived_at = time.time()
+    record = {"session_id": session_id, "archived_at": archived_at, "rows": rows}
+    member = gzip.compress(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    with get_store().lock(ARCHIVE_LOCK_KEY):
+        segments = _segments()
+        number = segments[-1][0] if segments else 1
+        path = _segment_path(number)
+        if path.exists() and path.stat().st_size > 0 and path.stat().st_size + len(member) > ARCHIVE_SEGMENT_BYTES:
+            number += 1
+            path = _segment_path(number)
+
+        offset = _write_durably(path, member)
+        entry = {
+            "session_id": session_id,
+            "segment": number,
+            "offset": offset,
+            "length": len(member),
+            "archived_at": archived_at,
+            "messages": len(rows),
+        }
+        index_path = ARCHIVE_DIR / INDEX_FILE
+        created = not index_path.exists()
+        _write_durably(index_path, json.dumps(entry).encode("utf-8") + b"\n")
+        if created:
+            _new_index_generation()
+        _prune(number)
+
+    METRICS.inc("archive_sessions_total")
+    METRICS.inc("archive_bytes_total", len(member))
+    return entry
+
+
+def list_archived_sessions(session_id: str) -> List[dict]:
+    """Index entries of the archived conversations of a session, oldest first."""
+    return _session_entries(session_id)
+
+
+def load_archived_session(session_id: str, position: int = -1) -> Optional[dict]:
+    """
+    Return an archived conversation of a session (the most recent by default) as
+    {session_id, archived_at, rows}, or None if there is none or it was pruned.
+    """
+    entries = _session_entries(session_id)
+    try:
+        entry = entries[position]
+    except IndexError:
+        return None
+    try:
+        with open(_segment_path(entry["segment"]), "rb") as file:
+            file.seek(entry["offset"])
+            member = file.read(entry["length"])
+    except FileNotFoundError:
+        return None
+    return json.loads(gzip.decompress(member))
@@ -0,0 +1,173 @@
+"""
+Offline replay of many conversations through the graph.
+
+Each input conversation is a JSON object with an `id` and a list of user
+`turns`. Conversations run concurrently (bounded by `max_concurrency`), each
+in its own chat history session, and one JSON result per conversation is
+yielded as soon as it finishes.
+
+Usage: python -m gen_ui_backend.batch conversations.jsonl -o results.jsonl --max-concurrency 16
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph.graph import CompiledGraph
+
+from gen_ui_backend.chain import create_graph
+from gen_ui_backend.history import delete_chat_history
+
+# Graph nodes whose wall-clock time is reported per conversation
+NODE_NAMES = ("invoke_model", "invoke_tools", "generate_final_response")
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class NodeTimingHandler(BaseCallbackHandler):
+    """Accumulates the wall-clock time spent in each graph node."""
+
+    def __init__(self) -> None:
+        self.timings_ms: Dict[str, float] = defaultdict(float)
+        self._started: Dict[UUID, tuple] = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        name = kwargs.get("name")
+        if name in NODE_NAMES:
+            with self._lock:
+                self._started[run_id] = (name, time.perf_counter())
+
+    def _finish(self, run_id: UUID) -> None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                name, started_at = started
+                self.timings_ms[name] += (time.perf_counter() - started_at) * 1000
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+
+def replay_conversation(conversation: dict, graph: CompiledGraph, batch_id: str) -> dict:
+    """Run the turns of one conversation in order, in an isolated history session."""
+    conversation_id = str(conversation.get("id", uuid.uuid4()))
+    session_id = f"batch-{batch_id}-{conversation_id}"
+    timings = NodeTimingHandler()
+    turns: List[dict] = []
+    started_at = time.perf_counter()
+    try:
+        for text in conversation.get("turns", []):
+            turn_started_at = time.perf_counter()
+            state = graph.invoke(
+                {"input": [HumanMessage(content=text)]},
+                {"configurable": {"session_id": session_id}, "callbacks": [timings]},
+            )
+            turns.append({
+                "input": text,
+                "result": state.get("result"),
+                "tool_calls": state.get("tool_calls"),
+                "final_response": state.get("final_response"),
+                "duration_ms": round((time.perf_counter() - turn_started_at) * 1000, 1),
+            })
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)}"
+    finally:
+        delete_chat_history(session_id)
+
+    return {
+        "id": conversation_id,
+        "turns": turns,
+        "error": error,
+        "duration_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        "node_timings_ms": {name: round(value, 1) for name, value in timings.timings_ms.items()},
+    }
+
+
+def run_batch(
+    conversations: Iterable[dict],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    graph: Optional[CompiledGraph] = None,
+) -> Iterator[dict]:
+    """
+    Replay conversations concurrently and yield one result per conversation,
+    in completion order.
+    """
+    graph = graph or create_graph()
+    batch_id = uuid.uuid4().hex[:8]
+    conversations = list(conversations)
+    replay = RunnableLambda(lambda conversation: replay_conversation(conversation, graph, batch_id))
+
+    for index, result in replay.batch_as_completed(
+        conversations, config={"max_concurrency": max_concurrency}, return_exceptions=True
+    ):
+        if isinstance(result, Exception):
+            conversation = conversations[index]
+            conversation_id = conversation.get("id", index) if isinstance(conversation, dict) else index
+            result = {"id": str(conversation_id), "turns": [], "error": str(result)}
+        yield result
+
+
+def read_conversations(lines: Iterable[str]) -> Iterator[dict]:
+    """Parse JSONL conversations, skipping blank lines. Raises ValueError for a line that isn't a conversation."""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            conversation = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {number} is not valid JSON: {str(e)}") from e
+        if not isinstance(conversation, dict):
+            raise ValueError(f"Line {number} is not a JSON object")
+        turns = conversation.get("turns", [])
+        if not isinstance(turns, list) or not all(isinstance(turn, str) for turn in turns):
+            raise ValueError(f"Line {number}: turns must be a list of strings")
+        yield conversation
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file with one conversation per line, '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file for the results, '-' for stdout")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    input_file = sys.stdin if args.input == "-" else open(args.input, "r")
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        try:
+            conversations = list(read_conversations(input_file))
+        except ValueError as e:
+            parser.error(f"{args.input}: {str(e)}")
+        started_at = time.perf_counter()
+        failed = 0
+        for result in run_batch(conversations, max_concurrency=args.max_concurrency):
+            failed += result["error"] is not None
+            output_file.write(json.dumps(result) + "\n")
+            output_file.flush()
+        elapsed = time.perf_counter() - started_at
+        print(
+            f"Replayed {len(conversations)} conversations ({failed} failed) in {elapsed:.1f}s",
+            file=sys.stderr,
+        )
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+import csv
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterator, List, Optional, Sequence, Set, Tuple
+
+from gen_ui_backend.config import (
+    CATALOG_PATH,
+    CATALOG_POLL_SECONDS,
+    IMAGES_DIR,
+    KNOWLEDGE_DIR,
+    MAX_NOT_FOUND_SUGGESTIONS,
+    PRODUCT_TYPE,
+)
+from gen_ui_backend.metrics import METRICS
+from gen_ui_backend.prefetch import clear_product_assets
+
+# A near-miss is only resolved when it is this similar to a product alias...
+RESOLVE_MIN_SCORE = 0.6
+# ...and clearly closer to it than to any other product
+RESOLVE_MIN_MARGIN = 0.15
+# Score of an alias that contains every word of the query, e.g. "razer blade"
+CONTAINED_SCORE = 0.8
+# Matches weaker than this are not worth suggesting
+SUGGEST_MIN_SCORE = 0.3
+
+# Catalog versions kept for graph runs that started before a reload
+CATALOG_VERSIONS_KEPT = 4
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+# Queries like "12" or "#12" are product IDs, never product names
+_ID_LIKE = re.compile(r"^\s*#?\d+\s*$")
+_PARENTHETICAL = re.compile(r"\([^)]*\)")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and symbols like ® and ™, collapse punctuation to spaces."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def _looks_like_id(query: str) -> bool:
+    return bool(_ID_LIKE.match(query))
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """Word trigrams of normalized text, with padded word boundaries like pg_trgm."""
+    grams: Set[str] = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def _product_aliases(product: Dict[str, str]) -> List[str]:
+    name = product.get("name", "")
+    brand = product.get("brand", "")
+    cpu_family = product.get("cpu_family", "")
+    short_name = _PARENTHETICAL.sub(" ", name)
+    aliases = [name, short_name, f"{short_name} {cpu_family}", f"{brand} {cpu_family}"]
+    if normalize(brand) not in normalize(name):
+        aliases += [f"{brand} {name}", f"{brand} {short_name}"]
+    return [alias for alias in dict.fromkeys(normalize(alias) for alias in aliases) if alias]
+
+
+class CatalogIndex:
+    """
+    Products of the catalog by ID, plus a precomputed trigram index over
+    aliases built from the `name`, `brand` and `cpu_family` columns.
+
+    The tools use it to resolve a product name or slightly wrong ID passed by
+    the model to a catalog product, instead of failing the turn.
+    """
+
+    def __init__(self, products: List[Dict[str, str]]):
+        self.products = products
+        self.by_id: Dict[str, Dict[str, str]] = {product["product_id"]: product for product in products}
+        self._by_folded_id = {normalize(product_id): product_id for product_id in self.by_id}
+
+        # Alias i is (normalized text, words, trigrams, product ID)
+        self._aliases: List[Tuple[str, FrozenSet[str], FrozenSet[str], str]] = []
+        self._by_alias: Dict[str, set] = {}
+        self._postings: Dict[str, List[int]] = {}
+        for product in products:
+            for alias in _product_aliases(product):
+                index = len(self._aliases)
+                grams = trigrams(alias)
+                self._aliases.append((alias, frozenset(alias.split()), grams, product["product_id"]))
+                self._by_alias.setdefault(alias, set()).add(product["product_id"])
+                for gram in grams:
+                    self._postings.setdefault(gram, []).append(index)
+
+    def _scores(self, query: str) -> List[Tuple[float, str]]:
+        """Best alias score per product for `query`, highest first."""
+        grams = trigrams(query)
+        if not grams:
+            return []
+        words = set(query.split())
+        shared = Counter(index for gram in grams for index in self._postings.get(gram, ()))
+
+        best: Dict[str, float] = {}
+        for index, count in shared.items():
+            _, alias_words, alias_grams, product_id = self._aliases[index]
+            score = 2 * count / (len(grams) + len(alias_grams))
+            if words <= alias_words:
+                score = max(score, CONTAINED_SCORE)
+            if score > best.get(product_id, 0):
+                best[product_id] = score
+        return sorted(((score, product_id) for product_id, score in best.items()), reverse=True)
+
+    def resolve(self, query: str) -> Optional[Dict[str, str]]:
+        """
+        Return the product `query` refers to: an exact product ID, an ID with
+        different case or punctuation, a product name, or an unambiguous near-miss
+        of a name. Unknown numeric IDs are not resolved.
+        """
+        product = self.by_id.get(query)
+        if product is not None:
+            return product
+
+        folded = normalize(query)
+        if folded in self._by_folded_id:
+            return self.by_id[self._by_folded_id[folded]]
+        if _looks_like_id(query):
+            # A stale or wrong ID must fail, not match a name containing the number
+            METRICS.inc("catalog_unresolved_total")
+            return None
+        exact = self._by_alias.get(folded, ())
+        if len(exact) == 1:
+            METRICS.inc("catalog_resolved_total")
+            return self.by_id[next(iter(exact))]
+
+        scores = self._scores(folded)
+        if scores and scores[0][0] >= RESOLVE_MIN_SCORE:
+            runner_up = scores[1][0] if len(scores) > 1 else 0
+            if scores[0][0] - runner_up >= RESOLVE_MIN_MARGIN:
+                METRICS.inc("catalog_resolved_total")
+                return self.by_id[scores[0][1]]
+        METRICS.inc("catalog_unresolved_total")
+        return None
+
+    def suggest(self, query: str, limit: int = MAX_NOT_FOUND_SUGGESTIONS) -> List[Dict[str, str]]:
+        """The products closest to `query`, as {product_id, name} pairs."""
+        return [
+            {"product_id": product_id, "name": self.by_id[product_id].get("name", "")}
+            for score, product_id in self._scores(normalize(query))[:limit]
+            if score >= SUGGEST_MIN_SCORE
+        ]
+
+
+def format_catalog_prompt(products: List[Dict[str, str]]) -> str:
+    """One line per product with all of its fields, as included in the system prompt."""
+    catalog_info = []
+    for product in products:
+        product_info = [f"ID: {product['product_id']}"]
+        for key, value in product.items():
+            if key != "product_id":
+                product_info.append(f"{key}: {value}")
+        catalog_info.append(", ".join(product_info))
+    return "\n".join(catalog_info)
+
+
+def _files_signature(*paths: Path) -> Tuple:
+    """Cheap change marker for files and the files directly inside directories."""
+    entries = []
+    for path in paths:
+        if path.is_dir():
+            with os.scandir(path) as scan:
+                files = [entry for entry in scan if entry.is_file()]
+            entries.extend(sorted((entry.path, entry.stat().st_mtime_ns, entry.stat().st_size) for entry in files))
+        elif path.exists():
+            stat = path.stat()
+            entries.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(entries)
+
+
+class CatalogVersion:
+    """
+    An immutable snapshot of the catalog: the products, their index and the
+    catalog text of the system prompt. `version` is derived from the catalog
+    contents and the asset files, so every worker process names the same
+    catalog the same way.
+    """
+
+    def __init__(self, version: str, products: List[Dict[str, str]], prompt_text: str, signature: Tuple):
+        self.version = version
+        self.products = products
+        self.index = CatalogIndex(products)
+        self.prompt_text = prompt_text
+        self.signature = signature
+        self.loaded_at = time.time()
+
+
+def validate_catalog(fieldnames: Optional[Sequence[str]], products: List[Dict[str, str]]) -> None:
+    """Raise ValueError for a catalog that must not replace a working one, e.g. a partly written file."""
+    if not fieldnames or "product_id" not in fieldnames:
+        raise ValueError(f"{CATALOG_PATH} has no product_id column")
+    if not products:
+        raise ValueError(f"{CATALOG_PATH} has no products")
+    seen = set()
+    for line, product in enumerate(products, start=2):
+        # csv fills the columns missing from a short row with None
+        if None in product.values() or None in product:
+            raise ValueError(f"{CATALOG_PATH} line {line} does not have one value per column")
+        product_id = product["product_id"].strip()
+        if not product_id:
+            raise ValueError(f"{CATALOG_PATH} line {line} has no product_id")
+        if product_id in seen:
+            raise ValueError(f"{CATALOG_PATH} has duplicate product_id {product_id}")
+        seen.add(product_id)
+
+
+def load_catalog_version() -> CatalogVersion:
+    """
+    Read the catalog file and build a new version, including its index and prompt text.
+    Raises ValueError if the catalog is not valid.
+    """
+    signature = _files_signature(CATALOG_PATH, IMAGES_DIR, KNOWLEDGE_DIR)
+    with open(CATALOG_PATH, "rb") as file:
+        content = file.read()
+    digest = hashlib.sha256(content)
+    digest.update(repr([entry[1:] for entry in signature[1:]]).encode())
+    reader = csv.DictReader(io.StringIO(content.decode("utf-8")))
+    products = list(reader)
+    validate_catalog(reader.fieldnames, products)
+    return CatalogVersion(digest.hexdigest()[:12], products, format_catalog_prompt(products), signature)
+
+
+class CatalogManager:
+    """
+    Holds the current catalog version and swaps in a new one when the catalog
+    file, the images or the knowledge files change.
+
+    A change is only picked up once the files look the same on two polls in a
+    row, so a file that is still being written isn't read, and a catalog that
+    fails validation is rejected and the current version kept.
+    New versions are built completely before the swap, which is a single
+    attribute assignment, so readers never see a half-built catalog. Recent
+    versions stay available by name, so a graph run that started on one version
+    keeps using it until it finishes.
+    """
+
+    def __init__(self, poll_interval: float = CATALOG_POLL_SECONDS):
+        self.poll_interval = poll_interval
+        self._current: Optional[CatalogVersion] = None
+        self._versions: "OrderedDict[str, CatalogVersion]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        # Signature of changed files seen on the last poll, built once it is seen again
+        self._pending_signature: Optional[Tuple] = None
+        # Signature of the files that last failed to load, not retried until they change
+        self._rejected_signature: Optional[Tuple] = None
+
+    @property
+    def current(self) -> CatalogVersion:
+        current = self._current
+        if current is None:
+            with self._lock:
+                current = self._current
+                if current is None:
+                    current = self._build()
+                    self._swap(current)
+        return current
+
+    def get(self, version: Optional[str]) -> CatalogVersion:
+        """Return a recent version by name, or the current version."""
+        if version is not None:
+            pinned = self._versions.get(version)
+            if pinned is not None:
+                return pinned
+            METRICS.inc("catalog_version_evicted_total")
+        return self.current
+
+    def _build(self) -> CatalogVersion:
+        try:
+            return load_catalog_version()
+        except Exception as e:
+            if self._current is not None:
+                raise
+            # Start without products rather than not at all, the tools report the error
+            print(f"Error loading catalog data: {str(e)}")
+            return CatalogVersion("unavailable", [], f"Error loading catalog data: {str(e)}", ())
+
+    def _swap(self, catalog: CatalogVersion) -> None:
+        self._versions[catalog.version] = catalog
+        self._versions.move_to_end(catalog.version)
+        while len(self._versions) > CATALOG_VERSIONS_KEPT:
+            self._versions.popitem(last=False)
+        self._current = catalog
+        # Images and marketing content may have changed with the new version
+        clear_product_assets()
+        METRICS.set_gauge("catalog_products", len(catalog.products))
+        METRICS.set_gauge("catalog_loaded_at", catalog.loaded_at)
+
+    def reload(self, wait_for_stable: bool = True) -> bool:
+        """
+        Build and swap in a new version if the files changed, and haven't changed
+        since the previous call unless `wait_for_stable` is False. Returns whether it did.
+        Raises if the new catalog can't be loaded.
+        """
+        current = self.current
+        signature = _files_signature(CATALOG_PATH, IMAGES_DIR, KNOWLEDGE_DIR)
+        if signature == current.signature or signature == self._rejected_signature:
+            self._pending_signature = None
+            return False
+        if wait_for_stable and signature != self._pending_signature:
+            self._pending_signature = signature
+            return False
+        self._pending_signature = None
+        try:
+            catalog = self._build()
+        except Exception:
+            self._rejected_signature = signature
+            raise
+        with self._lock:
+            if catalog.signature == current.signature or self._current is not current:
+                return False
+            self._swap(catalog)
+        METRICS.inc("catalog_reloads_total")
+        print(f"Loaded {PRODUCT_TYPE} catalog version {catalog.version} ({len(catalog.products)} products)")
+        return True
+
+    def _watch(self) -> None:
+        last_error = None
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.reload()
+                last_error = None
+            except Exception as e:
+                METRICS.inc("catalog_reload_errors_total")
+                # Report a broken catalog once, not on every poll
+                if str(e) != last_error:
+                    print(f"Error reloading catalog, keeping version {self.current.version}: {str(e)}")
+                last_error = str(e)
+
+    def start(self) -> None:
+        """Start polling the catalog files in a background thread."""
+        self.current
+        if self._watcher is None:
+            self._stopped.clear()
+            self._watcher = threading.Thread(target=self._watch, name="genui-catalog-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+
+CATALOG = CatalogManager()
+
+# Catalog version the current graph run is pinned to, see `pinned_catalog_version`
+_pinned_version: ContextVar[Optional[str]] = ContextVar("genui_catalog_version", default=None)
+
+
+def get_catalog() -> CatalogVersion:
+    """The catalog version pinned for the current graph run, or the current one."""
+    return CATALOG.get(_pinned_version.get())
+
+
+def get_catalog_index() -> CatalogIndex:
+    return get_catalog().index
+
+
+@contextmanager
+def pinned_catalog_version(version: Optional[str]) -> Iterator[None]:
+    """Make `get_catalog` return `version` in this context (and contexts copied from it)."""
+    token = _pinned_version.set(version)
+    try:
+        yield
+    finally:
+        _pinned_version.reset(token)
@@ -1,172 +1,189 @@
-from typing import List, Optional, TypedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, TypedDict
+import functools
 import os
-import csv
-from pathlib import Path
+import threading
+import time
 
 from langchain.output_parsers.openai_tools import JsonOutputToolsParser
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGenerationChunk
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables import RunnableConfig
+from langchain_core.pydantic_v1 import root_validator
+from langchain_core.runnables import Runnable, RunnableConfig
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END, StateGraph
 from langgraph.graph.graph import CompiledGraph
 
+from gen_ui_backend.catalog import get_catalog, pinned_catalog_version
 from gen_ui_backend.tools.product_details import product_details
 from gen_ui_backend.tools.product_comparison import product_comparison
 from gen_ui_backend.tools.product_tiles import product_tiles
 from gen_ui_backend.config import (
-    CATALOG_PATH, 
+    CHAT_MODEL,
+    LLM_MAX_RETRIES,
+    LLM_TIMEOUT_SECONDS,
     PRODUCT_TYPE, 
+    TOOL_TIMEOUT_SECONDS,
+    TOOL_WORKERS,
     get_system_prompt, 
     get_final_response_system_prompt
 )
+from gen_ui_backend.history import (
+    append_turn_to_chat_history,
+    get_session_id,
+    load_chat_history,
+    rows_to_messages,
+)
+from gen_ui_backend.metrics import METRICS, record_llm_usage
+from gen_ui_backend.prefetch import complete_product_ids, prefetch_product_assets
+from gen_ui_backend.profiling import llm_wait, profiled
+from gen_ui_backend.tools.payloads import compact_tool_result
 
 
-# Define the path for the chat history file
-backend_dir = Path(__file__).parent.parent
-HISTORY_FILE_PATH = backend_dir / "chat_history.csv"
-HISTORY_HEADERS = ["role", "content"]
+# Tools run on their own threads so a hung tool can't hold the graph run past its timeout.
+# A tool that times out keeps its thread until it returns. Once every thread of the pool is
+# held like that, a new pool is started, so later tool calls still run.
+tools_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="genui-tools")
+_tools_running_after_timeout: Dict[ThreadPoolExecutor, int] = {}
+_tools_executor_lock = threading.Lock()
 
-# Define the initial AI message
-INITIAL_AI_MESSAGE_CONTENT = f"Welcome! I'm your helpful {PRODUCT_TYPE} shopping assistant. How can I help you find the perfect {PRODUCT_TYPE} today?"
-INITIAL_AI_MESSAGE = AIMessage(content=INITIAL_AI_MESSAGE_CONTENT)
 
-# Load product catalog data
-def load_product_catalog():
-    try:
-        with open(CATALOG_PATH, 'r') as file:
-            reader = csv.DictReader(file)
-            products = list(reader)
-            
-        # Format the product info for the prompt
-        # This needs to be dynamic based on the available fields in the catalog
-        catalog_info = []
-        
-        for product in products:
-            # Get all fields from the product dictionary
-            product_info = [f"ID: {product['product_id']}"]
-            
-            # Add all other fields except product_id (which we already added)
-            for key, value in product.items():
-                if key != 'product_id':
-                    product_info.append(f"{key}: {value}")
-            
-            # Join the fields with commas
-            catalog_info.append(", ".join(product_info))
-        
-        return "\n".join(catalog_info)
-    except Exception as e:
-        return f"Error loading catalog data: {str(e)}"
+def submit_tool(fn: Callable, *args: Any) -> Tuple[ThreadPoolExecutor, Future]:
+    """Run `fn` on the tools pool. Returns the pool it was submitted to, and its future."""
+    with _tools_executor_lock:
+        return tools_executor, tools_executor.submit(fn, *args)
 
 
-# Load chat history from CSV
-def load_chat_history() -> List:
-    history = []
-    if not HISTORY_FILE_PATH.is_file() or HISTORY_FILE_PATH.stat().st_size == 0:
-        # Create the file with headers and initial AI message if it doesn't exist or is empty
-        try:
-            with open(HISTORY_FILE_PATH, "w", newline="") as file:
-                writer = csv.writer(file)
-                writer.writerow(HISTORY_HEADERS)
-                writer.writerow(["ai", INITIAL_AI_MESSAGE_CONTENT])
-            # Return only the initial AI message for a new session
-            return [INITIAL_AI_MESSAGE]
-        except Exception as e:
-             print(f"Error creating initial history file: {str(e)}. Returning empty history.")
-             return []
-
-    try:
-        with open(HISTORY_FILE_PATH, "r", newline="") as file:
-            reader = csv.DictReader(file)
-            if reader.fieldnames != HISTORY_HEADERS:
-                 # Handle case where headers are incorrect/missing
-                 print(f"Warning: History file {HISTORY_FILE_PATH} has incorrect headers. Resetting.")
-                 reset_chat_history() # This will reset and add the initial message
-                 return [INITIAL_AI_MESSAGE] # Return the initial message after reset
-
-            rows = list(reader)
-            # Check if the file only contains headers (or less), implying it was reset/corrupted somehow
-            # Or if the first message isn't the expected initial AI message
-            if not rows or (rows[0].get("role") != "ai" or rows[0].get("content") != INITIAL_AI_MESSAGE_CONTENT):
-                 print(f"Warning: History file {HISTORY_FILE_PATH} seems incomplete or missing initial message. Resetting.")
-                 reset_chat_history() # Reset to ensure initial message consistency
-                 return [INITIAL_AI_MESSAGE]
-
-            # Build history from rows, skipping the first row if it's the initial AI message
-            # The initial message is handled implicitly by the frontend or initial state
-            # Update: No, the history passed to the LLM needs the full context including the initial message.
-            for row in rows:
-                if row.get("role") == "human":
-                    history.append(HumanMessage(content=row.get("content", "")))
-                elif row.get("role") == "ai":
-                    history.append(AIMessage(content=row.get("content", "")))
-
-    except Exception as e:
-        print(f"Error loading chat history: {str(e)}. Resetting history.")
-        reset_chat_history() # Reset on error
-        return [INITIAL_AI_MESSAGE] # Return initial message after reset
-
-    # If history loaded successfully but is somehow empty (should not happen with checks above), return initial
-    if not history:
-        return [INITIAL_AI_MESSAGE]
-
-    return history
-
-
-# Append a message to the chat history CSV
-def append_to_chat_history(role: str, content: str):
-    # Prevent appending the initial AI message redundantly
-    if role == "ai" and content == INITIAL_AI_MESSAGE_CONTENT:
-        # Check if the file already contains this exact message as the first message
-        try:
-            if HISTORY_FILE_PATH.is_file() and HISTORY_FILE_PATH.stat().st_size > 0:
-                 with open(HISTORY_FILE_PATH, "r", newline="") as file:
-                    reader = csv.reader(file)
-                    header = next(reader, None) # Skip header
-                    first_message = next(reader, None)
-                    if first_message and first_message == ["ai", INITIAL_AI_MESSAGE_CONTENT]:
-                        # print("Skipping redundant append of initial AI message.") # Debugging line
-                        return # Don't append if it's already the first message
-        except Exception as e:
-             print(f"Error checking history before append: {str(e)}")
-             # Proceed with append if check fails, might lead to duplicates in rare cases
-
-    try:
-        # Ensure headers exist if file is empty or newly created (shouldn't be needed with load_chat_history changes)
-        # Mode 'a' will create the file if it doesn't exist, but load_chat_history should handle the initial state.
-        # We still need headers if somehow the file exists but is empty after load_chat_history ran? Unlikely.
-        # Adding a check just in case.
-        needs_headers = not HISTORY_FILE_PATH.is_file() or HISTORY_FILE_PATH.stat().st_size == 0
-
-        with open(HISTORY_FILE_PATH, "a", newline="") as file:
-            writer = csv.writer(file)
-            if needs_headers:
-                writer.writerow(HISTORY_HEADERS)
-                # If we are writing headers, it implies the file was empty,
-                # so we should also write the initial AI message IF the message
-                # being appended isn't the initial one itself.
-                if not (role == "ai" and content == INITIAL_AI_MESSAGE_CONTENT):
-                    writer.writerow(["ai", INITIAL_AI_MESSAGE_CONTENT])
-
-            writer.writerow([role, content])
-    except Exception as e:
-        print(f"Error appending to chat history: {str(e)}")
-
-
-# Function to reset/clear the chat history file
-def reset_chat_history():
-    try:
-        with open(HISTORY_FILE_PATH, "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(HISTORY_HEADERS) # Write headers
-            writer.writerow(["ai", INITIAL_AI_MESSAGE_CONTENT]) # Write initial AI message
-        print(f"Chat history reset: {HISTORY_FILE_PATH}")
-    except Exception as e:
-        print(f"Error resetting chat history: {str(e)}")
-
-
-# Load the catalog data
-PRODUCT_CATALOG = load_product_catalog()
+def abandon_tool(executor: ThreadPoolExecutor, future: Future) -> bool:
+    """
+    Stop waiting for a tool call that timed out. Returns False if it never started
+    (and now never will), True if it keeps running on its thread.
+    """
+    global tools_executor
+    METRICS.inc("tool_timeouts_total")
+    if future.cancel():
+        METRICS.inc("tool_timeouts_total.not_started")
+        return False
+
+    METRICS.inc("tool_timeouts_total.running")
+    with _tools_executor_lock:
+        _tools_running_after_timeout[executor] = _tools_running_after_timeout.get(executor, 0) + 1
+        METRICS.add_gauge("tools_running_after_timeout", 1)
+        if executor is tools_executor and _tools_running_after_timeout[executor] >= TOOL_WORKERS:
+            print(f"Warning: all {TOOL_WORKERS} tool threads are held by tools that timed out, starting new ones")
+            METRICS.inc("tool_pool_replacements_total")
+            tools_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="genui-tools")
+            # The old threads exit once their tools return
+            executor.shutdown(wait=False)
+
+    def finished(_: Future) -> None:
+        with _tools_executor_lock:
+            _tools_running_after_timeout[executor] -= 1
+            if not _tools_running_after_timeout[executor]:
+                del _tools_running_after_timeout[executor]
+            METRICS.add_gauge("tools_running_after_timeout", -1)
+
+    future.add_done_callback(finished)
+    return True
+
+
+# Raw `usage` of the completion being streamed in this context, see UsageReportingChatOpenAI
+_streamed_usage: ContextVar[Optional[dict]] = ContextVar("genui_streamed_usage", default=None)
+
+
+class _UsageCapturingStream:
+    """Wraps an OpenAI completion stream, keeping the raw `usage` of the chunk that carries it."""
+
+    def __init__(self, stream: Any):
+        self._stream = stream
+
+    def __enter__(self) -> "_UsageCapturingStream":
+        self._stream.__enter__()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> Any:
+        return self._stream.__exit__(*exc_info)
+
+    def __iter__(self) -> Iterator[Any]:
+        for chunk in self._stream:
+            if getattr(chunk, "usage", None) is not None:
+                _streamed_usage.set(chunk.usage.model_dump())
+            yield chunk
+
+
+class _UsageCapturingCompletions:
+    """Wraps the OpenAI chat completions client so streamed responses capture their usage."""
+
+    def __init__(self, completions: Any):
+        self._completions = completions
+
+    def create(self, **kwargs: Any) -> Any:
+        response = self._completions.create(**kwargs)
+        return _UsageCapturingStream(response) if kwargs.get("stream") else response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._completions, name)
+
+
+class UsageReportingChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI that puts the complete token usage of streamed responses, including
+    cached prompt tokens, in the response metadata as `token_usage`.
+
+    langchain-openai 0.1.8 has no `stream_usage` and only keeps the input, output and
+    total counts, so usage is requested with `stream_options` and captured from the client.
+    """
+
+    @root_validator(skip_on_failure=True)
+    def capture_stream_usage(cls, values: dict) -> dict:
+        values["client"] = _UsageCapturingCompletions(values["client"])
+        return values
+
+    def _stream(self, *args: Any, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        _streamed_usage.set(None)
+        for chunk in super()._stream(*args, **kwargs):
+            usage = _streamed_usage.get()
+            if usage is not None and getattr(chunk.message, "usage_metadata", None):
+                chunk.message.response_metadata["token_usage"] = usage
+                _streamed_usage.set(None)
+            yield chunk
+
+
+def create_chat_model() -> ChatOpenAI:
+    """Chat model shared by the graph nodes. Usage is streamed so cached prompt tokens can be tracked."""
+    return UsageReportingChatOpenAI(
+        model=CHAT_MODEL,
+        temperature=0,
+        streaming=True,
+        model_kwargs={"stream_options": {"include_usage": True}},
+        timeout=LLM_TIMEOUT_SECONDS,
+        max_retries=LLM_MAX_RETRIES,
+    )
+
+
+def stream_with_timeout(
+    chain: Runnable, inputs: dict, config: RunnableConfig, on_chunk: Optional[Callable] = None
+) -> Any:
+    """
+    Stream a chat model chain and return the accumulated message.
+
+    The HTTP client timeout only bounds each read, so the whole completion is
+    also bounded by LLM_TIMEOUT_SECONDS. That deadline is checked when a chunk
+    arrives: a stream that stalls is cut off by the read timeout, not the deadline.
+    `on_chunk` receives the message accumulated so far.
+    """
+    deadline = time.monotonic() + LLM_TIMEOUT_SECONDS
+    result = None
+    with llm_wait():
+        for chunk in chain.stream(inputs, config):
+            result = chunk if result is None else result + chunk
+            if on_chunk is not None:
+                on_chunk(result)
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Chat model did not finish within {LLM_TIMEOUT_SECONDS} seconds.")
+    return result
 
 
 class GenerativeUIState(TypedDict, total=False):
@@ -179,61 +196,111 @@ class GenerativeUIState(TypedDict, total=False):
     """The result of a tool call."""
     final_response: Optional[str]
     """Final response after tool results are processed."""
+    catalog_version: Optional[str]
+    """Catalog version the run started with, used by every node of the run even if the catalog is reloaded."""
+
+
+def last_user_message(state: GenerativeUIState) -> BaseMessage:
+    """The newest user input of the run."""
+    # Ensure input is always a list for consistent handling
+    current_input_messages = state["input"] if isinstance(state["input"], list) else [state["input"]]
+    # Assuming the last message in the list is the newest user input
+    return current_input_messages[-1]
+
+
+def pending_turn_rows(state: GenerativeUIState) -> List[List[str]]:
+    """
+    History rows (role, content) of the current turn not written yet: the user input,
+    and the tool call intent once the model asked for a tool. They are written in one
+    batch when the turn ends.
+    """
+    message = last_user_message(state)
+    if isinstance(message, HumanMessage):
+        rows = [["human", str(message.content)]]
+    else:
+        # Handle cases where input might not be HumanMessage directly (if structure changes)
+        print(f"Warning: Unexpected input type for history logging: {type(message)}")
+        rows = [["human", str(message)]]  # Log string representation
+    if state.get("tool_calls"):
+        rows.append(["ai", f"Tool Calls: {state['tool_calls']}"])
+    return rows
 
 
+def writes_turn_on_error(node: Callable) -> Callable:
+    """
+    Write the pending rows of the turn if the node fails, so the user's message
+    (and a tool call the user may already have seen) stays in the history.
+    """
+
+    @functools.wraps(node)
+    def wrapper(state: GenerativeUIState, config: RunnableConfig) -> GenerativeUIState:
+        try:
+            return node(state, config)
+        except Exception:
+            try:
+                append_turn_to_chat_history(pending_turn_rows(state), get_session_id(config))
+            except Exception as e:
+                print(f"Error writing the chat history of a failed turn: {str(e)}")
+            raise
+
+    return wrapper
+
+
+@writes_turn_on_error
+@profiled("invoke_model")
 def invoke_model(state: GenerativeUIState, config: RunnableConfig) -> GenerativeUIState:
     tools_parser = JsonOutputToolsParser()
     # Load existing chat history
-    history = load_chat_history()
+    session_id = get_session_id(config)
+    history = load_chat_history(session_id)
 
-    # Get the current user input message(s)
-    current_input_messages = state["input"]
-    if not isinstance(current_input_messages, list):
-         # Ensure input is always a list for consistent handling
-         current_input_messages = [current_input_messages]
+    # Get the current user input message
+    user_message = last_user_message(state)
 
-    # Append current user input to history file *before* invoking the model
-    # Assuming the last message in the list is the newest user input
-    last_user_message = current_input_messages[-1]
-    if isinstance(last_user_message, HumanMessage):
-        append_to_chat_history("human", str(last_user_message.content))
-    else:
-         # Handle cases where input might not be HumanMessage directly (if structure changes)
-         print(f"Warning: Unexpected input type for history logging: {type(last_user_message)}")
-         append_to_chat_history("human", str(last_user_message)) # Log string representation
 
+    # Pin the catalog version for the rest of the run
+    catalog = get_catalog()
 
+    # The system message (instructions, catalog, profile) and the stored history only ever
+    # grow at the end, so each request extends the previous one and hits the provider's
+    # prompt cache. Earlier turns sent by the client are already part of the stored history.
     initial_prompt = ChatPromptTemplate.from_messages(
         [
-            (
-                "system",
-                get_system_prompt() + "\n\n"
-                + f"Here's the current catalog of available {PRODUCT_TYPE}:\n"
-                + f"{PRODUCT_CATALOG}",
-            ),
-            # Combine loaded history with the current input from the state
+            SystemMessage(content=get_system_prompt(catalog.prompt_text)),
             *history,
             MessagesPlaceholder("input"),
         ]
     )
-    model = ChatOpenAI(model="gpt-4.1-2025-04-14", temperature=0, streaming=True)
+    model = create_chat_model()
     tools = [product_details, product_comparison, product_tiles]
     model_with_tools = model.bind_tools(tools)
     chain = initial_prompt | model_with_tools
-    result = chain.invoke({"input": state["input"]}, config)
+
+    # Stream the completion and start loading product assets as soon as the product IDs
+    # of a tool call are complete, so invoke_tools finds them ready when the stream ends.
+    prefetched_ids: Set[str] = set()
+
+    def prefetch_tool_call_products(partial_result: BaseMessage) -> None:
+        for tool_call_chunk in getattr(partial_result, "tool_call_chunks", None) or []:
+            product_ids = set(complete_product_ids(tool_call_chunk.get("args") or "")) - prefetched_ids
+            if product_ids:
+                prefetch_product_assets(product_ids)
+                prefetched_ids.update(product_ids)
+
+    result = stream_with_timeout(chain, {"input": [user_message]}, config, prefetch_tool_call_products)
 
     if not isinstance(result, AIMessage):
         raise ValueError("Invalid result from model. Expected AIMessage.")
+    record_llm_usage(result, "invoke_model")
 
     if isinstance(result.tool_calls, list) and len(result.tool_calls) > 0:
         parsed_tools = tools_parser.invoke(result, config)
-        # Log AI response (tool call intent)
-        append_to_chat_history("ai", f"Tool Calls: {parsed_tools}")
-        return {"tool_calls": parsed_tools}
+        # The user input and the tool call intent are written with the final response
+        return {"tool_calls": parsed_tools, "catalog_version": catalog.version}
     else:
-        # Log AI response (text)
-        append_to_chat_history("ai", str(result.content))
-        return {"result": str(result.content)}
+        # Log the turn (user input and AI text response)
+        append_turn_to_chat_history(pending_turn_rows(state) + [["ai", str(result.content)]], session_id)
+        return {"result": str(result.content), "catalog_version": catalog.version}
 
 
 def invoke_tools_or_return(state: GenerativeUIState) -> str:
@@ -245,7 +312,9 @@ def invoke_tools_or_return(state: GenerativeUIState) -> str:
         raise ValueError("Invalid state. No result or tool calls found.")
 
 
-def invoke_tools(state: GenerativeUIState) -> GenerativeUIState:
+@writes_turn_on_error
+@profiled("invoke_tools")
+def invoke_tools(state: GenerativeUIState, config: RunnableConfig) -> GenerativeUIState:
     tools_map = {
         "product-details": product_details,
         "product-comparison": product_comparison,
@@ -255,23 +324,41 @@ def invoke_tools(state: GenerativeUIState) -> GenerativeUIState:
     if state["tool_calls"] is not None:
         tool = state["tool_calls"][0]
         selected_tool = tools_map[tool["type"]]
-        return {"tool_result": selected_tool.invoke(tool["args"])}
+        # The tool thread runs in a copy of this context, so it sees the pinned catalog version
+        with pinned_catalog_version(state.get("catalog_version")):
+            executor, future = submit_tool(copy_context().run, profiled(f"tool:{tool['type']}")(selected_tool.invoke), tool["args"])
+        try:
+            tool_result = future.result(timeout=TOOL_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            if abandon_tool(executor, future):
+                tool_result = {"error": f"The {tool['type']} tool did not respond within {TOOL_TIMEOUT_SECONDS} seconds."}
+            else:
+                tool_result = {"error": f"The {tool['type']} tool could not be started within {TOOL_TIMEOUT_SECONDS} seconds, the server is busy."}
+        if tool_result is None:
+            # The run ends without a final response (see after_tools_routing), so write the turn now
+            append_turn_to_chat_history(pending_turn_rows(state), get_session_id(config))
+        return {"tool_result": tool_result}
     else:
         raise ValueError("No tool calls found in state.")
 
 
+@writes_turn_on_error
+@profiled("generate_final_response")
 def generate_final_response(state: GenerativeUIState, config: RunnableConfig) -> GenerativeUIState:
     """
     Generates a final response based on the tool results and original user query.
     """
+    session_id = get_session_id(config)
+    turn_rows = pending_turn_rows(state)
+
     if "tool_result" not in state or state["tool_result"] is None:
         # If no tool was run, the response was likely generated directly by invoke_model
         # and logged there. Return early.
         # Ensure final_response is explicitly set to None or an empty string if expected downstream
         return {"final_response": None}
 
-    # Load existing chat history
-    history = load_chat_history()
+    # Load existing chat history, plus the not yet written messages of this turn
+    history = load_chat_history(session_id) + rows_to_messages(turn_rows)
 
     # Get the tool type and result
     tool_type = state["tool_calls"][0]["type"] if state["tool_calls"] and state["tool_calls"][0] else "unknown tool"
@@ -315,13 +402,13 @@ def generate_final_response(state: GenerativeUIState, config: RunnableConfig) ->
         tool_description = "some information using a tool"
 
     tool_context_message = AIMessage(
-        content=f"Context: I previously invoked a tool to show the user {tool_description}. The raw result of that tool call was: {tool_result}{marketing_content}"
+        content=f"Context: I previously invoked a tool to show the user {tool_description}. The result of that tool call was: {compact_tool_result(tool_result)}{marketing_content}"
     )
 
     # Construct the prompt messages using the new system prompt
-    system_message = ("system", get_final_response_system_prompt())
+    system_message = SystemMessage(content=get_final_response_system_prompt())
 
-    model = ChatOpenAI(model="gpt-4.1-2025-04-14", temperature=0, streaming=True)
+    model = create_chat_model()
 
     # Combine history, original input, and tool context
     current_input_messages = state["input"] if isinstance(state["input"], list) else [state["input"]]
@@ -340,15 +427,16 @@ def generate_final_response(state: GenerativeUIState, config: RunnableConfig) ->
     final_prompt = ChatPromptTemplate.from_messages(messages)
 
     chain = final_prompt | model
-    # Pass an empty dict for invoke since the necessary context is built into the messages list
-    result = chain.invoke({}, config=config)
+    # Pass an empty dict since the necessary context is built into the messages list
+    result = stream_with_timeout(chain, {}, config)
 
     if not isinstance(result, AIMessage):
         raise ValueError("Invalid result from model. Expected AIMessage.")
+    record_llm_usage(result, "generate_final_response")
 
     final_content = str(result.content)
-    # Log the final AI response generated after tool execution
-    append_to_chat_history("ai", final_content)
+    # Log the whole turn, ending with the final AI response generated after tool execution
+    append_turn_to_chat_history(turn_rows + [["ai", final_content]], session_id)
 
     return {"final_response": final_content}
 
@@ -1,6 +1,14 @@
 import os
+from functools import lru_cache
 from pathlib import Path
 
+from dotenv import load_dotenv
+
+from gen_ui_backend.store import BaseStore, create_store
+
+# Load environment variables from .env file before the settings below read them
+load_dotenv()
+
 # Default product type
 DEFAULT_PRODUCT_TYPE = "laptops"
 
@@ -30,17 +38,109 @@ KNOWLEDGE_DIR = PRODUCTS_DIR / "knowledge"
 # User profile path
 USER_PROFILE_PATH = USER_PROFILES_DIR / f"{USER_PROFILE}.txt"
 
+# Shared store key for the user profile (relative to the backend directory)
+USER_PROFILE_KEY = f"user_profiles/{USER_PROFILE}.txt"
+
+# Shared state store: "file" (single node) or "redis" (multi node)
+STORE_BACKEND = os.environ.get("GENUI_STORE", "file")
+
+# Root directory of the file store (chat histories, profiles, caches)
+STORE_DIR = Path(os.environ.get("GENUI_STORE_DIR", BACKEND_DIR))
+
+# Redis connection URL, "local://" selects the in-process stand-in
+REDIS_URL = os.environ.get("GENUI_REDIS_URL", "")
+
+# Sessions whose parsed chat history each worker keeps in memory
+HISTORY_CACHE_SESSIONS = int(os.environ.get("GENUI_HISTORY_CACHE_SESSIONS", "1024"))
+
+# Archive of completed chat sessions: directory (a shared volume with several nodes),
+# size at which a new segment file is started, and retention by total size and age
+ARCHIVE_DIR = Path(os.environ.get("GENUI_ARCHIVE_DIR") or STORE_DIR / "archive")
+ARCHIVE_SEGMENT_BYTES = int(os.environ.get("GENUI_ARCHIVE_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+ARCHIVE_MAX_BYTES = int(os.environ.get("GENUI_ARCHIVE_MAX_BYTES", str(1024 * 1024 * 1024)))
+ARCHIVE_RETENTION_DAYS = float(os.environ.get("GENUI_ARCHIVE_RETENTION_DAYS", "90"))
+
+# Server settings
+SERVER_HOST = os.environ.get("GENUI_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("GENUI_PORT", "8000"))
+SERVER_WORKERS = int(os.environ.get("GENUI_WORKERS", "1"))
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.environ.get("GENUI_GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+
+# Chat model used by the graph nodes
+CHAT_MODEL = os.environ.get("GENUI_CHAT_MODEL", "gpt-4.1-2025-04-14")
+
+# Admission control for /chat (per worker process)
+MAX_CONCURRENT_RUNS = int(os.environ.get("GENUI_MAX_CONCURRENT_RUNS", "16"))
+MAX_QUEUED_RUNS = int(os.environ.get("GENUI_MAX_QUEUED_RUNS", "32"))
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get("GENUI_QUEUE_TIMEOUT_SECONDS", "10"))
+RETRY_AFTER_SECONDS = int(os.environ.get("GENUI_RETRY_AFTER_SECONDS", "5"))
+
+# The /batch replay endpoint is off unless enabled, it runs outside admission control.
+# Batches sent to it may run at most BATCH_MAX_CONCURRENCY conversations at once.
+BATCH_API_ENABLED = os.environ.get("GENUI_BATCH_API", "false").lower() in ("1", "true", "yes")
+BATCH_MAX_CONCURRENCY = int(os.environ.get("GENUI_BATCH_MAX_CONCURRENCY", "8"))
+
+# How often the catalog, images and knowledge files are checked for changes
+CATALOG_POLL_SECONDS = float(os.environ.get("GENUI_CATALOG_POLL_SECONDS", "2"))
+
+# Tool response size limits
+MAX_TILES_PER_PAGE = int(os.environ.get("GENUI_MAX_TILES_PER_PAGE", "12"))
+MAX_NOT_FOUND_SUGGESTIONS = int(os.environ.get("GENUI_MAX_NOT_FOUND_SUGGESTIONS", "5"))
+
+# Catalog columns each tool responds with, per product type. They mirror the fields the
+# UI shows for that tool in frontend/components/prebuilt/config/<product type>.ts, since
+# every column is repeated in the LLM context for every product. Tools of product types
+# that aren't listed respond with every column.
+LAPTOP_DETAIL_FIELDS = (
+    "name", "brand", "price", "cpu_family", "ram_gb", "storage_gb", "storage_type", "screen_size_inches",
+    "screen_resolution", "screen_type", "graphics_card", "battery_life_hours", "weight_kg",
+)
+LAPTOP_BADGE_FIELDS = ("ram_gb", "storage_gb", "screen_size_inches", "battery_life_hours")
+
+TOOL_RESPONSE_FIELDS = {
+    "laptops": {
+        "product-details": ("product_id", *LAPTOP_DETAIL_FIELDS, "marketing_link"),
+        "product-comparison": ("product_id", *LAPTOP_DETAIL_FIELDS, "marketing_link"),
+        # Tiles show the name, brand, price and link of each product, plus its badges
+        "product-tiles": ("product_id", "name", "brand", "price", "marketing_link", *LAPTOP_BADGE_FIELDS),
+    },
+}
+
+# Timeouts for the graph nodes. The LLM timeout bounds each read of the HTTP client, and
+# is checked against the whole completion as chunks arrive, so a stream that stalls is only
+# cut off by the read timeout: a call can take up to about twice LLM_TIMEOUT_SECONDS.
+LLM_TIMEOUT_SECONDS = float(os.environ.get("GENUI_LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.environ.get("GENUI_LLM_MAX_RETRIES", "1"))
+TOOL_TIMEOUT_SECONDS = float(os.environ.get("GENUI_TOOL_TIMEOUT_SECONDS", "10"))
+
+# Threads running tool calls (per worker process)
+TOOL_WORKERS = int(os.environ.get("GENUI_TOOL_WORKERS", "8"))
+
+# Request profiling: share of /chat requests profiled without asking (0 disables sampling),
+# how long profiles are kept, and how often the flame graph sampler looks at the stacks
+PROFILE_SAMPLE_RATE = float(os.environ.get("GENUI_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TTL_SECONDS = int(os.environ.get("GENUI_PROFILE_TTL_SECONDS", "86400"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get("GENUI_PROFILE_SAMPLE_INTERVAL_MS", "5"))
+
 # API endpoints
 # Use the new dynamic endpoint structure: /api/product-images/[type]/[id]
 PRODUCT_IMAGES_ENDPOINT = f"/api/product-images/{PRODUCT_TYPE}"
 
+@lru_cache(maxsize=None)
+def get_store() -> BaseStore:
+    """Return the shared state store for this process."""
+    return create_store(STORE_BACKEND, STORE_DIR, REDIS_URL)
+
 # Function to load user profile
 def load_user_profile():
     """
-    Load user profile from the profiles directory.
-    Returns the content as a string or None if the file doesn't exist.
+    Load user profile from the shared store.
+    Falls back to the profiles directory for stores that have not been seeded yet.
     """
     try:
+        profile = get_store().get(USER_PROFILE_KEY)
+        if profile is not None:
+            return profile
         if USER_PROFILE_PATH.exists():
             with open(USER_PROFILE_PATH, 'r') as file:
                 return file.read()
@@ -50,6 +150,11 @@ def load_user_profile():
         print(f"Error loading user profile {USER_PROFILE}: {str(e)}")
         return "Error loading profile."
 
+# Function to save user profile
+def save_user_profile(content: str) -> None:
+    """Write the user profile content to the shared store."""
+    get_store().set(USER_PROFILE_KEY, content)
+
 # Function to load marketing content for a specific product
 def load_marketing_content(product_id):
     """
@@ -67,16 +172,13 @@ def load_marketing_content(product_id):
         return None
 
 # System prompt templates
-# These will be formatted with the product type and user profile
+# The instructions are formatted with the product type only. The catalog and the user
+# profile are appended after them, so every request starts with the same bytes and
+# providers can reuse their cached prompt prefix across turns and users.
 SYSTEM_PROMPT_TEMPLATE = """
 You are a helpful {product_type} shopping assistant focused on understanding user needs and providing a guided, visual shopping experience. 
 Your primary goal is to use tools to present information and recommendations, creating a generative UI interaction whenever possible. Focus on how {product_type} features benefit the user rather than just listing specs. Use the provided {product_type} catalog to find relevant Product IDs for tool usage.
 
-User Profile Information:
-{user_profile}
-
-You should use this profile information to personalize your recommendations and responses. Consider the user's preferences, browsing history, past purchases, and other relevant information when suggesting products or answering questions.
-
 You have these tools:
 
 1. `product-details`: Use ONLY when showing EXACTLY ONE {product_type} item.
@@ -130,9 +232,6 @@ FINAL_RESPONSE_SYSTEM_PROMPT_TEMPLATE = """
 You are a helpful {product_type} shopping assistant. A tool has just presented information to the user (e.g., product details, comparison, recommendations). 
 Your task is to provide a concise, **benefit-focused** textual response that connects the user's query, the chat history, and the information just displayed by the tool. Your goal is to help the user understand the information in the context of their needs and guide them forward.
 
-User Profile Information:
-{user_profile}
-
 Instructions:
 - Use the user profile information to personalize your responses. Reference specific preferences, past behavior, or characteristics when relevant.
 - Review the chat history, the user's original input, and the preceding AI message which describes the tool action and its results.
@@ -148,12 +247,47 @@ Instructions:
 - Keep the response relevant and avoid simply repeating raw data already visible in the tool output. Focus on **interpretation, benefits, and next steps**.
 """
 
-def get_system_prompt() -> str:
-    """Return the formatted system prompt for the current product type and user profile."""
-    user_profile = load_user_profile()
-    return SYSTEM_PROMPT_TEMPLATE.format(product_type=PRODUCT_TYPE, user_profile=user_profile)
+CATALOG_PROMPT_TEMPLATE = """
+Here's the current catalog of available {product_type}:
+"""
+
+USER_PROFILE_PROMPT_TEMPLATE = """
+User Profile Information:
+{user_profile}
+
+You should use this profile information to personalize your recommendations and responses. Consider the user's preferences, browsing history, past purchases, and other relevant information when suggesting products or answering questions.
+"""
+
+FINAL_RESPONSE_USER_PROFILE_PROMPT_TEMPLATE = """
+User Profile Information:
+{user_profile}
+"""
+
+SYSTEM_PROMPT = SYSTEM_PROMPT_TEMPLATE.format(product_type=PRODUCT_TYPE)
+FINAL_RESPONSE_SYSTEM_PROMPT = FINAL_RESPONSE_SYSTEM_PROMPT_TEMPLATE.format(product_type=PRODUCT_TYPE)
+
+
+@lru_cache(maxsize=32)
+def build_system_prompt(catalog: str, user_profile: str) -> str:
+    """Assemble the system prompt from its most to least stable parts: instructions, catalog, profile."""
+    return (
+        SYSTEM_PROMPT
+        + CATALOG_PROMPT_TEMPLATE.format(product_type=PRODUCT_TYPE)
+        + catalog + "\n"
+        + USER_PROFILE_PROMPT_TEMPLATE.format(user_profile=user_profile)
+    )
+
+
+@lru_cache(maxsize=32)
+def build_final_response_system_prompt(user_profile: str) -> str:
+    """Assemble the final response system prompt: instructions first, then the profile."""
+    return FINAL_RESPONSE_SYSTEM_PROMPT + FINAL_RESPONSE_USER_PROFILE_PROMPT_TEMPLATE.format(user_profile=user_profile)
+
+
+def get_system_prompt(catalog: str) -> str:
+    """Return the system prompt for the given catalog text and the current user profile."""
+    return build_system_prompt(catalog, load_user_profile())
 
 def get_final_response_system_prompt() -> str:
-    """Return the formatted final response system prompt for the current product type and user profile."""
-    user_profile = load_user_profile()
-    return FINAL_RESPONSE_SYSTEM_PROMPT_TEMPLATE.format(product_type=PRODUCT_TYPE, user_profile=user_profile) 
\ No newline at end of file
+    """Return the final response system prompt for the current user profile."""
+    return build_final_response_system_prompt(load_user_profile())
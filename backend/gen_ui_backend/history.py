@@ -0,0 +1,205 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+
+from gen_ui_backend.archive import archive_session
+from gen_ui_backend.config import HISTORY_CACHE_SESSIONS, PRODUCT_TYPE, get_store
+from gen_ui_backend.store import Cursor
+
+# Session used when the caller doesn't pass one (the single chat of the frontend)
+DEFAULT_SESSION_ID = "default"
+
+# Shared store keys for the chat history (CSV files for the file store)
+HISTORY_KEY = "chat_history.csv"
+SESSION_HISTORY_DIR = "chat_histories"
+HISTORY_HEADERS = ["role", "content"]
+
+# Define the initial AI message
+INITIAL_AI_MESSAGE_CONTENT = f"Welcome! I'm your helpful {PRODUCT_TYPE} shopping assistant. How can I help you find the perfect {PRODUCT_TYPE} today?"
+INITIAL_AI_MESSAGE = AIMessage(content=INITIAL_AI_MESSAGE_CONTENT)
+INITIAL_HISTORY_ROWS = [HISTORY_HEADERS, ["ai", INITIAL_AI_MESSAGE_CONTENT]]
+
+# Parsed history per store key, with the store cursor it was read up to, for the
+# HISTORY_CACHE_SESSIONS most recently used sessions. Entries are replaced, never mutated.
+_history_cache: "OrderedDict[str, Tuple[Cursor, Tuple[BaseMessage, ...]]]" = OrderedDict()
+_history_cache_lock = threading.Lock()
+
+
+def _cached_history(key: str) -> Optional[Tuple[Cursor, Tuple[BaseMessage, ...]]]:
+    with _history_cache_lock:
+        cached = _history_cache.get(key)
+        if cached is not None:
+            _history_cache.move_to_end(key)
+        return cached
+
+
+def _cache_history(key: str, cursor: Optional[Cursor], messages: Tuple[BaseMessage, ...]) -> None:
+    with _history_cache_lock:
+        if cursor is None:
+            _history_cache.pop(key, None)
+        else:
+            _history_cache[key] = (cursor, messages)
+            _history_cache.move_to_end(key)
+            while len(_history_cache) > HISTORY_CACHE_SESSIONS:
+                _history_cache.popitem(last=False)
+
+
+def get_session_id(config: Optional[RunnableConfig]) -> str:
+    """Return the session ID passed as `configurable.session_id`, or the default session."""
+    configurable = (config or {}).get("configurable") or {}
+    return str(configurable.get("session_id") or DEFAULT_SESSION_ID)
+
+
+def get_history_key(session_id: str = DEFAULT_SESSION_ID) -> str:
+    """Return the store key holding the history of a session."""
+    if session_id == DEFAULT_SESSION_ID:
+        return HISTORY_KEY
+    safe_session_id = re.sub(r"[^A-Za-z0-9_.-]", "_", session_id)
+    return f"{SESSION_HISTORY_DIR}/{safe_session_id}.csv"
+
+
+def rows_to_messages(rows: List[List[str]]) -> List[BaseMessage]:
+    """Convert history rows (role, content) into LangChain messages."""
+    messages: List[BaseMessage] = []
+    for row in rows:
+        if len(row) != len(HISTORY_HEADERS):
+            continue
+        role, content = row
+        if role == "human":
+            messages.append(HumanMessage(content=content))
+        elif role == "ai":
+            messages.append(AIMessage(content=content))
+    return messages
+
+
+# Load chat history from the shared store
+def load_chat_history(session_id: str = DEFAULT_SESSION_ID) -> List:
+    """
+    Return the history of a session as LangChain messages.
+
+    The parsed messages are cached per session. Appends made through this module
+    update the cache directly, and changes made by other processes are picked up
+    by reading only the rows written after the cached cursor.
+    """
+    store = get_store()
+    key = get_history_key(session_id)
+    cached = _cached_history(key)
+    try:
+        if cached is not None and store.cursor(key) == cached[0]:
+            return list(cached[1])
+
+        with store.lock(key):
+            cursor = store.cursor(key)
+            if cached is not None and cursor is not None and cursor[0] == cached[0][0] and cursor[1] >= cached[0][1]:
+                # Same generation, only new rows were appended: parse just those
+                rows, cursor = store.read_rows_since(key, cached[0])
+                messages = cached[1] + tuple(rows_to_messages(rows))
+                _cache_history(key, cursor, messages)
+                return list(messages)
+
+            rows, cursor = store.read_rows_since(key)
+            if not rows:
+                # Create the history with headers and initial AI message if it doesn't exist or is empty
+                store.write_rows(key, INITIAL_HISTORY_ROWS)
+                _cache_history(key, store.cursor(key), (INITIAL_AI_MESSAGE,))
+                # Return only the initial AI message for a new session
+                return [INITIAL_AI_MESSAGE]
+    except Exception as e:
+        print(f"Error loading chat history: {str(e)}. Resetting history.")
+        reset_chat_history(session_id, archive=False) # Reset on error
+        return [INITIAL_AI_MESSAGE] # Return initial message after reset
+
+    if rows[0] != HISTORY_HEADERS:
+        # Handle case where headers are incorrect/missing
+        print(f"Warning: History {key} has incorrect headers. Resetting.")
+        reset_chat_history(session_id, archive=False) # This will reset and add the initial message
+        return [INITIAL_AI_MESSAGE] # Return the initial message after reset
+
+    rows = rows[1:]
+    # Check if the history only contains headers, implying it was reset/corrupted somehow
+    # Or if the first message isn't the expected initial AI message
+    if not rows or rows[0] != ["ai", INITIAL_AI_MESSAGE_CONTENT]:
+        print(f"Warning: History {key} seems incomplete or missing initial message. Resetting.")
+        reset_chat_history(session_id, archive=False) # Reset to ensure initial message consistency
+        return [INITIAL_AI_MESSAGE]
+
+    # The history passed to the LLM needs the full context including the initial message.
+    messages = tuple(rows_to_messages(rows))
+    _cache_history(key, cursor, messages)
+    return list(messages)
+
+
+# Append the messages of a turn to the chat history in a single write
+def append_turn_to_chat_history(rows: List[List[str]], session_id: str = DEFAULT_SESSION_ID) -> None:
+    """
+    Append a batch of (role, content) rows to a session's history.
+
+    Writes for the same session are serialized by the store lock, and the
+    whole batch lands in one write, so concurrent turns never interleave rows.
+    """
+    store = get_store()
+    key = get_history_key(session_id)
+    try:
+        with store.lock(key):
+            # Prevent appending the initial AI message redundantly
+            batch = [row for row in rows if row != ["ai", INITIAL_AI_MESSAGE_CONTENT]]
+            if not store.exists(key):
+                # The history is empty, so write headers and the initial AI message first
+                batch = INITIAL_HISTORY_ROWS + batch
+            if not batch:
+                return
+            before = store.cursor(key)
+            store.append_rows(key, batch)
+            cached = _cached_history(key)
+            if cached is not None and cached[0] == before:
+                # Nobody else wrote since we last read, so extend the cached messages
+                _cache_history(key, store.cursor(key), cached[1] + tuple(rows_to_messages(batch)))
+    except Exception as e:
+        print(f"Error appending to chat history: {str(e)}")
+
+
+# Append a message to the chat history
+def append_to_chat_history(role: str, content: str, session_id: str = DEFAULT_SESSION_ID) -> None:
+    append_turn_to_chat_history([[role, content]], session_id)
+
+
+# Function to reset/clear the chat history
+def reset_chat_history(session_id: str = DEFAULT_SESSION_ID, archive: bool = True) -> None:
+    """
+    Start a new conversation in a session. The previous conversation is moved to
+    the archive, unless it's empty, corrupted or `archive` is False.
+    """
+    store = get_store()
+    key = get_history_key(session_id)
+    try:
+        with store.lock(key):
+            rows = store.read_rows(key) if archive else []
+            store.write_rows(key, INITIAL_HISTORY_ROWS)
+            _cache_history(key, store.cursor(key), (INITIAL_AI_MESSAGE,))
+        print(f"Chat history reset: {key}")
+    except Exception as e:
+        print(f"Error resetting chat history: {str(e)}")
+        return
+
+    # Archived outside the history lock, store locks can't be nested
+    if len(rows) > len(INITIAL_HISTORY_ROWS) and rows[:len(INITIAL_HISTORY_ROWS)] == INITIAL_HISTORY_ROWS:
+        try:
+            archive_session(session_id, rows[1:])
+        except Exception as e:
+            print(f"Error archiving chat history {key}: {str(e)}")
+
+
+# Function to delete the chat history of a session
+def delete_chat_history(session_id: str = DEFAULT_SESSION_ID) -> None:
+    store = get_store()
+    key = get_history_key(session_id)
+    try:
+        with store.lock(key):
+            store.delete(key)
+            _cache_history(key, None, ())
+    except Exception as e:
+        print(f"Error deleting chat history: {str(e)}")
@@ -0,0 +1,71 @@
+import os
+import threading
+from typing import Dict, Optional, Union
+
+from langchain_core.messages import BaseMessage
+
+Number = Union[int, float]
+
+
+class Metrics:
+    """
+    Thread-safe counters and gauges for this process.
+
+    Each worker process keeps its own values, so the `/metrics` response
+    includes the process ID and should be aggregated per replica.
+    """
+
+    def __init__(self) -> None:
+        self._counters: Dict[str, Number] = {}
+        self._gauges: Dict[str, Number] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: Number = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: Number) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def add_gauge(self, name: str, value: Number) -> None:
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + value
+
+    def get(self, name: str) -> Optional[Number]:
+        with self._lock:
+            return self._counters.get(name, self._gauges.get(name))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+            }
+
+
+METRICS = Metrics()
+
+
+def record_llm_usage(message: BaseMessage, node: str) -> None:
+    """
+    Record token usage of a chat model response, including prompt tokens served
+    from the provider's prompt cache.
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+
+    input_tokens = usage.get("input_tokens") or token_usage.get("prompt_tokens") or 0
+    cached_tokens = (
+        (usage.get("input_token_details") or {}).get("cache_read")
+        or (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        or 0
+    )
+
+    METRICS.inc("llm_calls_total")
+    METRICS.inc(f"llm_calls_total.{node}")
+    METRICS.inc("llm_input_tokens_total", input_tokens)
+    METRICS.inc(f"llm_input_tokens_total.{node}", input_tokens)
+    METRICS.inc("llm_cached_input_tokens_total", cached_tokens)
+    METRICS.inc(f"llm_cached_input_tokens_total.{node}", cached_tokens)
@@ -0,0 +1,84 @@
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+from gen_ui_backend.config import (
+    IMAGES_DIR,
+    PRODUCT_IMAGES_ENDPOINT,
+    load_marketing_content,
+)
+
+# How long loaded assets are reused. Long enough to cover a tool turn,
+# short enough that edited images and knowledge files show up quickly.
+ASSET_CACHE_TTL_SECONDS = 60
+
+# Only IDs that look like catalog IDs are loaded speculatively, since they
+# come from a model response that is still being streamed.
+PRODUCT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# Complete values of the product ID arguments in a partial tool-call JSON string
+_SCALAR_ID = re.compile(r'"product_id(?:_1|_2)?"\s*:\s*(?:"([^"\\]*)"|(\d+)\s*[,}])')
+_ID_LIST = re.compile(r'"product_ids"\s*:\s*\[([^\]]*)(\]?)')
+_ID_LIST_ITEM = re.compile(r'"([^"\\]*)"|(\d+)\s*(?=[,\]])')
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="genui-prefetch")
+_assets: Dict[str, Tuple[float, Future]] = {}
+_assets_lock = threading.Lock()
+
+
+def complete_product_ids(raw_args: str) -> List[str]:
+    """
+    Return the product IDs that are already complete in a partially streamed
+    tool-call arguments string, e.g. '{"product_ids": ["1", "4", "1'.
+    """
+    product_ids = [quoted or number for quoted, number in _SCALAR_ID.findall(raw_args)]
+    for items, closing in _ID_LIST.findall(raw_args):
+        product_ids.extend(quoted or number for quoted, number in _ID_LIST_ITEM.findall(items + closing))
+    return product_ids
+
+
+def _load_product_assets(product_id: str) -> dict:
+    has_image = (IMAGES_DIR / f"{product_id}.jpg").exists()
+    return {
+        "has_image": has_image,
+        "image_url": f"{PRODUCT_IMAGES_ENDPOINT}/{product_id}" if has_image else None,
+        "marketing_content": load_marketing_content(product_id),
+    }
+
+
+def _assets_future(product_id: str) -> Future:
+    now = time.monotonic()
+    with _assets_lock:
+        entry = _assets.get(product_id)
+        if entry is not None and now - entry[0] < ASSET_CACHE_TTL_SECONDS:
+            return entry[1]
+        for expired_id in [key for key, (loaded_at, _) in _assets.items() if now - loaded_at >= ASSET_CACHE_TTL_SECONDS]:
+            del _assets[expired_id]
+        future = _executor.submit(_load_product_assets, product_id)
+        _assets[product_id] = (now, future)
+        return future
+
+
+def clear_product_assets() -> None:
+    """Forget loaded assets, e.g. after the images or knowledge files changed."""
+    with _assets_lock:
+        _assets.clear()
+
+
+def prefetch_product_assets(product_ids: Iterable[str]) -> None:
+    """Start loading the image flag and marketing content of products in the background."""
+    for product_id in product_ids:
+        if PRODUCT_ID_PATTERN.match(product_id):
+            _assets_future(product_id)
+
+
+def get_product_assets(product_id: str) -> dict:
+    """
+    Return `has_image`, `image_url` and `marketing_content` for a product,
+    reusing (or waiting for) a load started by `prefetch_product_assets`.
+    """
+    if not PRODUCT_ID_PATTERN.match(product_id):
+        return _load_product_assets(product_id)
+    return _assets_future(product_id).result()
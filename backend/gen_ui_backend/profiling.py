@@ -0,0 +1,293 @@
+"""
+Opt-in profiling of individual /chat requests.
+
+A request is profiled when it carries the `X-GenUI-Profile` header, or when it
+is picked by GENUI_PROFILE_SAMPLE_RATE. Its ID is returned in the
+`X-GenUI-Profile-Id` response header, and the profile can be fetched from
+`/profiles/{id}` (summary) and `/profiles/{id}/flamegraph` (collapsed stacks for
+flamegraph.pl or speedscope) until it expires. With the file store, expired
+profiles are deleted by the next save, at most every PROFILE_PURGE_INTERVAL_SECONDS.
+
+For each graph node (and tool call) a profile records wall and CPU time, and
+how much of the wall time was spent waiting for the chat model. It also keeps
+the cProfile stats of the node threads and wall-clock stack samples taken by a
+background thread, so time blocked on the network shows up in the flame graph.
+
+When a request isn't profiled, the only cost is a context variable lookup per node.
+"""
+import asyncio
+import cProfile
+import functools
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import FrameType
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from gen_ui_backend.config import (
+    PROFILE_SAMPLE_INTERVAL_MS,
+    PROFILE_TTL_SECONDS,
+    get_store,
+)
+from gen_ui_backend.metrics import METRICS
+
+PROFILE_HEADER = "x-genui-profile"
+PROFILE_ID_HEADER = "x-genui-profile-id"
+
+# Functions listed in a profile summary, by cumulative time
+TOP_FUNCTIONS = 40
+# Innermost frames kept per stack sample
+MAX_STACK_DEPTH = 64
+# How often saving a profile also deletes the expired ones
+PROFILE_PURGE_INTERVAL_SECONDS = 300
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("genui_active_profile", default=None)
+_active_section: ContextVar[Optional[str]] = ContextVar("genui_active_section", default=None)
+
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RequestProfile:
+    """Timings, cProfile stats and stack samples of one profiled request."""
+
+    def __init__(self, profile_id: str, sample_interval: float = PROFILE_SAMPLE_INTERVAL_MS / 1000):
+        self.profile_id = profile_id
+        self.started_at = time.time()
+        self.sample_interval = sample_interval
+        self.sections: Dict[str, Dict[str, float]] = {}
+        self.stacks: Counter = Counter()
+        self._stats: Optional[pstats.Stats] = None
+        self._started = time.perf_counter()
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def _add(self, section: str, **values: float) -> None:
+        with self._lock:
+            totals = self.sections.setdefault(section, {})
+            for name, value in values.items():
+                totals[name] = totals.get(name, 0) + value
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(self.sample_interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads.items())
+            for thread_id, section in threads:
+                frame = frames.get(thread_id)
+                labels: List[str] = []
+                while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                if labels:
+                    self.stacks[";".join([section, *reversed(labels)])] += 1
+
+    @contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        """Profile the calling thread while the block runs, accounted to `name`."""
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._threads[thread_id] = name
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name="genui-profile-sampler", daemon=True)
+                self._sampler.start()
+
+        token = _active_section.set(name)
+        profiler = cProfile.Profile()
+        wall_started, cpu_started = time.perf_counter(), time.thread_time()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._add(
+                name,
+                calls=1,
+                wall_ms=(time.perf_counter() - wall_started) * 1000,
+                cpu_ms=(time.thread_time() - cpu_started) * 1000,
+            )
+            _active_section.reset(token)
+            with self._lock:
+                self._threads.pop(thread_id, None)
+                if self._stats is None:
+                    self._stats = pstats.Stats(profiler)
+                else:
+                    self._stats.add(profiler)
+
+    def finish(self) -> dict:
+        """Stop sampling and return the profile as a JSON-serializable dict."""
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+        sections = {}
+        for name, totals in self.sections.items():
+            wall_ms, cpu_ms = totals.get("wall_ms", 0), totals.get("cpu_ms", 0)
+            llm_wait_ms = max(0.0, totals.get("llm_wall_ms", 0) - totals.get("llm_cpu_ms", 0))
+            sections[name] = {
+                "calls": int(totals.get("calls", 0)),
+                "wall_ms": round(wall_ms, 2),
+                "cpu_ms": round(cpu_ms, 2),
+                "llm_wait_ms": round(llm_wait_ms, 2),
+                "other_wait_ms": round(max(0.0, wall_ms - cpu_ms - llm_wait_ms), 2),
+            }
+
+        top_functions = []
+        if self._stats is not None:
+            # `Stats.stats` isn't in the typeshed stubs
+            stats: Dict[tuple, tuple] = getattr(self._stats, "stats")
+            entries = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+            for (filename, line, function), (_, calls, self_time, cumulative, _) in entries[:TOP_FUNCTIONS]:
+                top_functions.append({
+                    "function": f"{function} ({filename}:{line})",
+                    "calls": calls,
+                    "self_ms": round(self_time * 1000, 3),
+                    "cumulative_ms": round(cumulative * 1000, 3),
+                })
+
+        return {
+            "profile_id": self.profile_id,
+            "started_at": self.started_at,
+            "duration_ms": round((time.perf_counter() - self._started) * 1000, 2),
+            "sample_interval_ms": self.sample_interval * 1000,
+            "sections": sections,
+            "top_functions": top_functions,
+            "collapsed_stacks": "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()),
+        }
+
+
+def profiled(name: str) -> Callable[[Callable], Callable]:
+    """Decorator accounting a graph node (or any call) to `name` when the request is profiled."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            profile = _active_profile.get()
+            if profile is None:
+                return func(*args, **kwargs)
+            with profile.section(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def llm_wait() -> Iterator[None]:
+    """Mark the block as a chat model call, so its waiting time is reported apart from CPU time."""
+    profile = _active_profile.get()
+    section = _active_section.get()
+    if profile is None or section is None:
+        yield
+        return
+    wall_started, cpu_started = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        profile._add(
+            section,
+            llm_wall_ms=(time.perf_counter() - wall_started) * 1000,
+            llm_cpu_ms=(time.thread_time() - cpu_started) * 1000,
+        )
+
+
+def _profile_key(profile_id: str) -> str:
+    return f"profiles/{profile_id}.json"
+
+
+def save_profile(profile: RequestProfile) -> None:
+    store = get_store()
+    store.set(_profile_key(profile.profile_id), json.dumps(profile.finish()), ttl=PROFILE_TTL_SECONDS)
+    purge_expired_profiles()
+
+
+def purge_expired_profiles(min_interval: float = PROFILE_PURGE_INTERVAL_SECONDS) -> None:
+    """
+    Delete expired profiles, unless that was done less than `min_interval` seconds ago.
+    The file store only expires a value when it is read, and most profiles never are.
+    """
+    global _last_purge
+    if time.time() - _last_purge < min_interval or not _purge_lock.acquire(blocking=False):
+        return
+    try:
+        _last_purge = time.time()
+        purged = get_store().purge_expired("profiles/")
+        if purged:
+            METRICS.inc("profiles_expired_total", purged)
+    finally:
+        _purge_lock.release()
+
+
+def load_profile(profile_id: str) -> Optional[dict]:
+    """Return a stored profile, or None if the ID is unknown or the profile has expired."""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    content = get_store().get(_profile_key(profile_id))
+    return json.loads(content) if content else None
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling the POST requests under `path_prefix` that ask
+    for it with the `X-GenUI-Profile` header, or are sampled at `sample_rate`.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = 0.0, path_prefix: str = "/chat"):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.path_prefix = path_prefix
+
+    def _wants_profile(self, scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER.encode():
+                return value.lower() not in (b"", b"0", b"false")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.path_prefix)
+            or not self._wants_profile(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(uuid.uuid4().hex)
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (PROFILE_ID_HEADER.encode(), profile.profile_id.encode())]
+            await send(message)
+
+        token = _active_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _active_profile.reset(token)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, save_profile, profile)
+                METRICS.inc("profiles_captured_total")
+            except Exception as e:
+                print(f"Error saving profile {profile.profile_id}: {str(e)}")
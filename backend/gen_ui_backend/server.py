@@ -1,33 +1,116 @@
 import uvicorn
-from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from langserve import add_routes
-import csv
 import os
 from pathlib import Path
-from pydantic import BaseModel
+from typing import List
+import orjson
+from pydantic import BaseModel, Field
 
-from gen_ui_backend.chain import create_graph, reset_chat_history, load_chat_history
+from gen_ui_backend.admission import AdmissionController, AdmissionMiddleware
+from gen_ui_backend.batch import DEFAULT_MAX_CONCURRENCY, run_batch
+from gen_ui_backend.catalog import CATALOG, get_catalog
+from gen_ui_backend.chain import create_graph
+from gen_ui_backend.archive import load_archived_session
+from gen_ui_backend.history import (
+    DEFAULT_SESSION_ID,
+    get_history_key,
+    load_chat_history,
+    reset_chat_history,
+    rows_to_messages,
+)
+from gen_ui_backend.metrics import METRICS
+from gen_ui_backend.profiling import PROFILE_ID_HEADER, ProfilingMiddleware, load_profile
 from gen_ui_backend.types import ChatInputType
-from gen_ui_backend.config import CATALOG_PATH, PRODUCT_TYPE, IMAGES_DIR, PRODUCT_IMAGES_ENDPOINT, USER_PROFILES_DIR, USER_PROFILE, USER_PROFILE_PATH, load_user_profile
+from gen_ui_backend.config import (
+    PRODUCT_TYPE,
+    IMAGES_DIR,
+    PRODUCT_IMAGES_ENDPOINT,
+    USER_PROFILES_DIR,
+    USER_PROFILE,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_WORKERS,
+    GRACEFUL_SHUTDOWN_TIMEOUT,
+    MAX_CONCURRENT_RUNS,
+    MAX_QUEUED_RUNS,
+    QUEUE_TIMEOUT_SECONDS,
+    RETRY_AFTER_SECONDS,
+    PROFILE_SAMPLE_RATE,
+    BATCH_API_ENABLED,
+    BATCH_MAX_CONCURRENCY,
+    STORE_BACKEND,
+    REDIS_URL,
+    get_store,
+    load_user_profile,
+    save_user_profile,
+)
 
 # Needed for proper JSON serialization of LangChain messages
 from langchain_core.messages import AIMessage, HumanMessage
 
-# Load environment variables from .env file
-load_dotenv()
-
 # Define request model for updating user profile
 class UserProfileUpdate(BaseModel):
     content: str
 
+# Define request model for offline batch replays
+class BatchRequest(BaseModel):
+    conversations: List[dict]
+    max_concurrency: int = Field(min(DEFAULT_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY), ge=1, le=BATCH_MAX_CONCURRENCY)
 
-def start() -> None:
+
+async def forward_session_id(config: dict, request: Request) -> dict:
+    """
+    langserve drops configurable keys the graph doesn't declare, so copy the
+    `configurable.session_id` sent by the client back into the run config.
+    /chat/batch may send a list with one config per input, in which case this
+    is called once per config, in order.
+    """
+    try:
+        body = await request.json()
+    except Exception:
+        return config
+    body_config = body.get("config") if isinstance(body, dict) else None
+    if isinstance(body_config, list):
+        position = getattr(request.state, "config_position", 0)
+        request.state.config_position = position + 1
+        body_config = body_config[position] if position < len(body_config) else None
+    configurable = body_config.get("configurable") if isinstance(body_config, dict) else None
+    session_id = configurable.get("session_id") if isinstance(configurable, dict) else None
+    if session_id:
+        config["configurable"] = {**(config.get("configurable") or {}), "session_id": str(session_id)}
+    return config
+
+
+def create_app() -> FastAPI:
+    """
+    Application factory used by uvicorn, so every worker process builds its own app.
+    """
     app = FastAPI(
         title="Gen UI Backend",
         version="1.0",
         description="A simple api server using Langchain's Runnable interfaces",
+        # Tool payloads can be large, orjson encodes them much faster than the stdlib
+        default_response_class=ORJSONResponse,
+    )
+
+    # Profile the /chat requests that ask for it (or are sampled). Added first so the
+    # profile covers the graph run, not the time spent queued for admission.
+    app.add_middleware(ProfilingMiddleware, sample_rate=PROFILE_SAMPLE_RATE, path_prefix="/chat")
+
+    # Bound concurrent graph runs on /chat, queue a few more and reject the rest.
+    # Added before CORS so rejections still carry the CORS headers.
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=AdmissionController(
+            max_concurrency=MAX_CONCURRENT_RUNS,
+            max_queue=MAX_QUEUED_RUNS,
+            queue_timeout=QUEUE_TIMEOUT_SECONDS,
+            retry_after=RETRY_AFTER_SECONDS,
+        ),
+        path_prefix="/chat",
     )
 
     # Configure CORS
@@ -42,35 +125,62 @@ def start() -> None:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[PROFILE_ID_HEADER],
     )
 
     graph = create_graph()
 
     runnable = graph.with_types(input_type=ChatInputType, output_type=dict)
 
-    add_routes(app, runnable, path="/chat", playground_type="chat")
+    add_routes(app, runnable, path="/chat", playground_type="chat", per_req_config_modifier=forward_session_id)
 
     # Add endpoint to reset chat history
     @app.post("/reset")
-    async def reset_history_endpoint():
-        reset_chat_history()
+    async def reset_history_endpoint(session_id: str = DEFAULT_SESSION_ID):
+        """
+        Starts a new conversation, moving the previous one to the archive.
+        """
+        reset_chat_history(session_id)
         return {"message": "Chat history reset successfully"}
     
+    # Add endpoint to replay many conversations offline. Its graph runs don't go
+    # through admission control, so it is only served when enabled.
+    if BATCH_API_ENABLED:
+        @app.post("/batch")
+        async def batch_endpoint(batch_request: BatchRequest) -> StreamingResponse:
+            """
+            Replays the given conversations through the graph with bounded concurrency,
+            each in its own history session. Streams one JSON result per line as
+            conversations finish.
+            """
+            results = run_batch(batch_request.conversations, max_concurrency=batch_request.max_concurrency, graph=graph)
+            return StreamingResponse((orjson.dumps(result, default=str) + b"\n" for result in results), media_type="application/x-ndjson")
+
     # Add endpoint to get current chat history
     @app.get("/history")
-    async def get_history_endpoint():
+    async def get_history_endpoint(session_id: str = DEFAULT_SESSION_ID, archived: bool = False):
         """
-        Loads and returns the current chat history, ensuring the initial
+        Loads and returns the current chat history of a session, ensuring the initial
         AI message is present for new or reset histories.
+        With `archived=true`, or for a session that no longer has a current history,
+        returns the session's most recent archived conversation instead.
         Returns history in a format suitable for the frontend.
         """
-        history_messages = load_chat_history()
+        archived_at = None
+        if archived or (session_id != DEFAULT_SESSION_ID and not get_store().exists(get_history_key(session_id))):
+            archived_session = load_archived_session(session_id)
+            if archived_session is None:
+                raise HTTPException(status_code=404, detail=f"No archived conversation found for session {session_id}")
+            history_messages = rows_to_messages(archived_session["rows"])
+            archived_at = archived_session["archived_at"]
+        else:
+            history_messages = load_chat_history(session_id)
         # Convert LangChain message objects to simple dicts/lists for JSON response
         history_serializable = []
         for msg in history_messages:
             role = "human" if isinstance(msg, HumanMessage) else "ai"
             history_serializable.append([role, str(msg.content)])
-        return {"history": history_serializable}
+        return {"history": history_serializable, "session_id": session_id, "archived_at": archived_at}
 
     # Add endpoint to get current user profile
     @app.get("/user-profile")
@@ -112,12 +222,8 @@ def start() -> None:
         Updates the current user profile content.
         """
         try:
-            if not USER_PROFILES_DIR.exists():
-                USER_PROFILES_DIR.mkdir(parents=True, exist_ok=True)
-                
-            with open(USER_PROFILE_PATH, 'w') as file:
-                file.write(profile_update.content)
-                
+            save_user_profile(profile_update.content)
+
             return {"message": f"User profile {USER_PROFILE} updated successfully"}
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error updating user profile: {str(e)}")
@@ -126,13 +232,11 @@ def start() -> None:
     @app.get("/products")
     async def get_products():
         try:
-            with open(CATALOG_PATH, 'r') as file:
-                reader = csv.DictReader(file)
-                products = list(reader)
+            catalog = get_catalog()
             
             # Add image information for each product
             enhanced_products = []
-            for product in products:
+            for product in catalog.products:
                 product_id = product["product_id"]
                 image_path = IMAGES_DIR / f"{product_id}.jpg"
                 has_image = image_path.exists()
@@ -145,10 +249,68 @@ def start() -> None:
                 
             return {
                 "products": enhanced_products,
-                "product_type": PRODUCT_TYPE
+                "product_type": PRODUCT_TYPE,
+                "catalog_version": catalog.version
             }
         except Exception as e:
             return {"error": f"Error loading {PRODUCT_TYPE} data: {str(e)}"}
 
-    print("Starting server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Add endpoint to expose process metrics
+    @app.get("/metrics")
+    async def get_metrics() -> dict:
+        """
+        Returns the counters and gauges of this worker process, and its catalog version.
+        """
+        return {**METRICS.snapshot(), "catalog_version": get_catalog().version}
+
+    # Add endpoints to fetch the profile of a profiled /chat request
+    @app.get("/profiles/{profile_id}")
+    async def get_profile(profile_id: str) -> dict:
+        """
+        Returns the timings per graph node and the top functions of a profiled request.
+        """
+        profile = load_profile(profile_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found or expired")
+        return profile
+
+    @app.get("/profiles/{profile_id}/flamegraph", response_class=PlainTextResponse)
+    async def get_profile_flamegraph(profile_id: str) -> str:
+        """
+        Returns the stack samples of a profiled request in the collapsed format
+        read by flamegraph.pl and speedscope.
+        """
+        profile = load_profile(profile_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found or expired")
+        return profile["collapsed_stacks"]
+
+    # Reload the catalog in the background when its files change
+    @app.on_event("startup")
+    async def start_catalog_watcher() -> None:
+        CATALOG.start()
+
+    @app.on_event("shutdown")
+    async def stop_catalog_watcher() -> None:
+        CATALOG.stop()
+
+    @app.on_event("shutdown")
+    async def close_store() -> None:
+        get_store().close()
+
+    return app
+
+
+def start() -> None:
+    if SERVER_WORKERS > 1 and STORE_BACKEND == "redis" and (not REDIS_URL or REDIS_URL.startswith("local://")):
+        print("Warning: the local Redis stand-in is not shared between workers. Set GENUI_REDIS_URL or use GENUI_STORE=file.")
+
+    print(f"Starting server with {SERVER_WORKERS} worker(s)...")
+    uvicorn.run(
+        "gen_ui_backend.server:create_app",
+        factory=True,
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        workers=SERVER_WORKERS,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+    )
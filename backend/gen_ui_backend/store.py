@@ -0,0 +1,414 @@
+import csv
+import io
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Tuple, Union
+
+# Position in a row list: (generation, offset). The generation changes whenever
+# the list is rewritten, the offset grows with every append.
+Cursor = Tuple[int, int]
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+
+
+class BaseStore:
+    """
+    Shared state used by the history, profile and cache layers.
+
+    Keys are relative paths (e.g. "chat_history.csv" or "user_profiles/default.txt")
+    so the file store can keep the existing on-disk layout, while other stores
+    simply use them as key names.
+
+    Two kinds of values are supported:
+    - text values (`get`/`set`/`delete`), with an optional TTL for cache entries;
+      `purge_expired` removes expired values in stores that don't expire them on their own
+    - row lists (`exists`/`read_rows`/`append_rows`/`write_rows`), used for the chat history
+
+    Row lists also expose a `Cursor` so callers can cache parsed rows and only
+    read what was appended since (`cursor`/`read_rows_since`).
+
+    `lock` returns a mutex that is shared by every process using the same store.
+    """
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def purge_expired(self, prefix: str = "") -> int:
+        """Delete the expired text values whose key starts with `prefix`. Returns how many were deleted."""
+        return 0
+
+    def read_rows(self, key: str) -> List[List[str]]:
+        raise NotImplementedError
+
+    def cursor(self, key: str) -> Optional[Cursor]:
+        """Return the current end position of a row list, or None if it doesn't exist."""
+        raise NotImplementedError
+
+    def read_rows_since(self, key: str, cursor: Optional[Cursor] = None) -> Tuple[List[List[str]], Optional[Cursor]]:
+        """
+        Return the rows after `cursor` and the new end position.
+        `cursor` must belong to the current generation, pass None to read everything.
+        """
+        raise NotImplementedError
+
+    def append_rows(self, key: str, rows: List[List[str]]) -> None:
+        raise NotImplementedError
+
+    def write_rows(self, key: str, rows: List[List[str]]) -> None:
+        raise NotImplementedError
+
+    def lock(self, key: str) -> ContextManager[Any]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class FileStore(BaseStore):
+    """
+    Single-node store backed by plain files under `root`.
+
+    Text values are stored as-is, row lists as CSV files. Cross-process locking
+    uses `flock` on one of `lock_stripes` files in `.locks/`, so several workers
+    on the same machine can safely share the directory without leaving a lock
+    file behind for every key. Locks must not be nested.
+
+    Appends are written with a single fsync'd write and rewrites go through a
+    temporary file that is renamed into place, so readers never see torn rows.
+    Cursors are (generation, byte offset). The generation is kept in a `<key>.gen`
+    sidecar and changes whenever a row list is (re)created; inode numbers can't be
+    used for this, since renames reuse them.
+    """
+
+    def __init__(self, root: Path, lock_stripes: int = 64):
+        self.root = Path(root)
+        self.lock_stripes = lock_stripes
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def _expiry_path(self, key: str) -> Path:
+        return self.root / f"{key}.ttl"
+
+    def _generation_path(self, key: str) -> Path:
+        return self.root / f"{key}.gen"
+
+    def _generation(self, key: str) -> int:
+        try:
+            return int(self._generation_path(key).read_text() or "0")
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _new_generation(self, key: str) -> None:
+        # Clock based, so a row list that is deleted and created again never
+        # gets back a generation that some process still has cached
+        generation = max(time.time_ns(), self._generation(key) + 1)
+        self._replace(self._generation_path(key), str(generation).encode("utf-8"))
+
+    @staticmethod
+    def _tmp_path(path: Path) -> Path:
+        return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    @staticmethod
+    def _encode_rows(rows: List[List[str]]) -> bytes:
+        buffer = io.StringIO(newline="")
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+
+    def _replace(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._tmp_path(path)
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path(key)
+        expiry_path = self._expiry_path(key)
+        try:
+            if expiry_path.exists() and float(expiry_path.read_text()) < time.time():
+                self.delete(key)
+                return None
+            with open(path, "r") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        self._replace(self.path(key), value.encode("utf-8"))
+        expiry_path = self._expiry_path(key)
+        if ttl is not None:
+            expiry_path.write_text(str(time.time() + ttl))
+        elif expiry_path.exists():
+            expiry_path.unlink()
+
+    def delete(self, key: str) -> None:
+        for path in (self.path(key), self._expiry_path(key), self._generation_path(key)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def exists(self, key: str) -> bool:
+        try:
+            return self.path(key).stat().st_size > 0
+        except FileNotFoundError:
+            return False
+
+    def purge_expired(self, prefix: str = "") -> int:
+        # Expired values are otherwise only deleted when they are read again.
+        # The prefix is taken as a directory.
+        now = time.time()
+        purged = 0
+        for expiry_path in (self.root / prefix).rglob("*.ttl"):
+            try:
+                expired = float(expiry_path.read_text()) < now
+            except (FileNotFoundError, ValueError):
+                continue
+            if expired:
+                self.delete(expiry_path.relative_to(self.root).as_posix()[:-len(".ttl")])
+                purged += 1
+        return purged
+
+    def read_rows(self, key: str) -> List[List[str]]:
+        try:
+            with open(self.path(key), "r", newline="") as file:
+                return list(csv.reader(file))
+        except FileNotFoundError:
+            return []
+
+    def cursor(self, key: str) -> Optional[Cursor]:
+        # The size is read before the generation. Writers change the generation before
+        # replacing the file, so a size paired with a generation never belongs to an older one.
+        try:
+            size = self.path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+        return (self._generation(key), size)
+
+    def read_rows_since(self, key: str, cursor: Optional[Cursor] = None) -> Tuple[List[List[str]], Optional[Cursor]]:
+        try:
+            with open(self.path(key), "rb") as file:
+                generation = self._generation(key)
+                if cursor is not None and cursor[0] == generation:
+                    file.seek(cursor[1])
+                data = file.read()
+                end = file.tell()
+        except FileNotFoundError:
+            return [], None
+        rows = list(csv.reader(io.StringIO(data.decode("utf-8"), newline="")))
+        return rows, (generation, end)
+
+    def append_rows(self, key: str, rows: List[List[str]]) -> None:
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not path.exists():
+            self._new_generation(key)
+        with open(path, "ab") as file:
+            file.write(self._encode_rows(rows))
+            file.flush()
+            os.fsync(file.fileno())
+
+    def write_rows(self, key: str, rows: List[List[str]]) -> None:
+        self._new_generation(key)
+        self._replace(self.path(key), self._encode_rows(rows))
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        lock_path = self.root / ".locks" / f"{zlib.crc32(key.encode('utf-8')) % self.lock_stripes}.lock"
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the subset of the redis-py client used by `RedisStore`.
+
+    Useful for development and single-process deployments where running a
+    Redis server is not worth it. It is NOT shared between worker processes.
+    """
+
+    def __init__(self) -> None:
+        self._values: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._lists: Dict[str, List[str]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._mutex = threading.Lock()
+
+    def get(self, name: str) -> Optional[str]:
+        with self._mutex:
+            entry = self._values.get(name)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._values[name]
+                return None
+            return value
+
+    def set(self, name: str, value: str, ex: Optional[int] = None) -> bool:
+        with self._mutex:
+            self._values[name] = (value, time.time() + ex if ex is not None else None)
+        return True
+
+    def delete(self, *names: str) -> int:
+        deleted = 0
+        with self._mutex:
+            for name in names:
+                if self._values.pop(name, None) is not None:
+                    deleted += 1
+                if self._lists.pop(name, None) is not None:
+                    deleted += 1
+        return deleted
+
+    def exists(self, *names: str) -> int:
+        with self._mutex:
+            return sum(1 for name in names if name in self._values or self._lists.get(name))
+
+    def incr(self, name: str) -> int:
+        with self._mutex:
+            value = int(self._values.get(name, ("0", None))[0]) + 1
+            self._values[name] = (str(value), None)
+            return value
+
+    def llen(self, name: str) -> int:
+        with self._mutex:
+            return len(self._lists.get(name, []))
+
+    def rpush(self, name: str, *values: str) -> int:
+        with self._mutex:
+            items = self._lists.setdefault(name, [])
+            items.extend(values)
+            return len(items)
+
+    def lrange(self, name: str, start: int, end: int) -> List[str]:
+        with self._mutex:
+            items = self._lists.get(name, [])
+            return list(items[start:] if end == -1 else items[start:end + 1])
+
+    def lock(self, name: str, timeout: Optional[float] = None) -> ContextManager[Any]:
+        with self._mutex:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def close(self) -> None:
+        pass
+
+
+class RedisStore(BaseStore):
+    """
+    Store backed by a Redis-compatible client (redis-py or `LocalRedis`).
+
+    Rows are kept as CSV-encoded list items so they round-trip exactly like
+    the file store. Cursors are (rewrite counter, list length).
+    """
+
+    def __init__(self, client: Any, prefix: str = "genui:", lock_timeout: int = 30):
+        self.client = client
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    @staticmethod
+    def _decode(value: Union[str, bytes]) -> str:
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    @staticmethod
+    def _encode_row(row: List[str]) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(row)
+        return buffer.getvalue()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self._key(key))
+        return None if value is None else self._decode(value)
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        self.client.set(self._key(key), value, ex=ttl)
+
+    def delete(self, key: str) -> None:
+        # A row list created again under this key must not match cursors of the deleted one
+        self.client.incr(self._key(f"{key}:generation"))
+        self.client.delete(self._key(key))
+
+    def exists(self, key: str) -> bool:
+        return bool(self.client.exists(self._key(key)))
+
+    def _decode_row(self, item: Union[str, bytes]) -> List[str]:
+        return next(csv.reader(io.StringIO(self._decode(item))))
+
+    def _generation(self, key: str) -> int:
+        return int(self._decode(self.client.get(self._key(f"{key}:generation")) or "0"))
+
+    def read_rows(self, key: str) -> List[List[str]]:
+        return [self._decode_row(item) for item in self.client.lrange(self._key(key), 0, -1)]
+
+    def cursor(self, key: str) -> Optional[Cursor]:
+        length = self.client.llen(self._key(key))
+        return (self._generation(key), length) if length else None
+
+    def read_rows_since(self, key: str, cursor: Optional[Cursor] = None) -> Tuple[List[List[str]], Optional[Cursor]]:
+        generation = self._generation(key)
+        start = cursor[1] if cursor is not None and cursor[0] == generation else 0
+        items = self.client.lrange(self._key(key), start, -1)
+        if not start and not items:
+            return [], None
+        return [self._decode_row(item) for item in items], (generation, start + len(items))
+
+    def append_rows(self, key: str, rows: List[List[str]]) -> None:
+        if rows:
+            self.client.rpush(self._key(key), *[self._encode_row(row) for row in rows])
+
+    def write_rows(self, key: str, rows: List[List[str]]) -> None:
+        self.client.incr(self._key(f"{key}:generation"))
+        self.client.delete(self._key(key))
+        self.append_rows(key, rows)
+
+    def lock(self, key: str) -> ContextManager[Any]:
+        return self.client.lock(self._key(f"{key}.lock"), timeout=self.lock_timeout)
+
+    def close(self) -> None:
+        self.client.close()
+
+
+def create_store(backend: str, root: Path, redis_url: str = "") -> BaseStore:
+    """Create the store selected by the `GENUI_STORE` setting."""
+    if backend == "file":
+        return FileStore(root)
+    if backend == "redis":
+        if not redis_url or redis_url.startswith("local://"):
+            return RedisStore(LocalRedis())
+        try:
+            # Optional dependency, without type stubs
+            import redis  # type: ignore[import]
+        except ImportError as e:
+            raise ImportError(
+                "The redis store requires the `redis` package. Install it with `pip install redis`."
+            ) from e
+        return RedisStore(redis.Redis.from_url(redis_url))
+    raise ValueError(f"Unknown store backend: {backend}. Expected 'file' or 'redis'.")
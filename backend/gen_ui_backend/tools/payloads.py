@@ -0,0 +1,32 @@
+from typing import Any, Dict
+
+import orjson
+
+from gen_ui_backend.config import PRODUCT_TYPE, TOOL_RESPONSE_FIELDS
+
+# Fields of a tool result that only matter to the UI, left out of the LLM context
+UI_ONLY_FIELDS = {"has_image", "image_url", "marketing_content"}
+
+
+def project_product(product: Dict[str, str], tool_name: str) -> Dict[str, str]:
+    """Return the catalog columns of a product that `tool_name` responds with."""
+    fields = TOOL_RESPONSE_FIELDS.get(PRODUCT_TYPE, {}).get(tool_name)
+    if fields is None:
+        return dict(product)
+    return {key: value for key, value in product.items() if key in fields}
+
+
+def compact_tool_result(tool_result: Any) -> str:
+    """
+    Encode a tool result for the LLM context: UI-only fields dropped, compact JSON.
+    Marketing content is passed to the model separately.
+    """
+
+    def strip(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {key: strip(item) for key, item in value.items() if key not in UI_ONLY_FIELDS}
+        if isinstance(value, list):
+            return [strip(item) for item in value]
+        return value
+
+    return orjson.dumps(strip(tool_result), default=str).decode()
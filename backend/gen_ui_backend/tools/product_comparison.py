@@ -1,12 +1,14 @@
 import os
-import csv
-from typing import Optional, List
+from typing import Dict, Optional, List
 from pathlib import Path
 
 from langchain.pydantic_v1 import BaseModel, Field
 from langchain_core.tools import tool
 
-from gen_ui_backend.config import CATALOG_PATH, IMAGES_DIR, PRODUCT_IMAGES_ENDPOINT, PRODUCT_TYPE, load_marketing_content
+from gen_ui_backend.catalog import get_catalog_index
+from gen_ui_backend.config import PRODUCT_TYPE
+from gen_ui_backend.prefetch import get_product_assets
+from gen_ui_backend.tools.payloads import project_product
 
 
 class ProductComparisonInput(BaseModel):
@@ -19,50 +21,36 @@ class ProductComparisonInput(BaseModel):
 def product_comparison(product_id_1: str, product_id_2: str, description: str = "") -> dict:
     """Compare two products side-by-side based on their product IDs."""
     try:
-        with open(CATALOG_PATH, 'r') as file:
-            reader = csv.DictReader(file)
-            products = list(reader)
+        catalog = get_catalog_index()
         
-        # Find the products with the matching product IDs
-        product1 = next((p for p in products if p["product_id"] == product_id_1), None)
-        product2 = next((p for p in products if p["product_id"] == product_id_2), None)
+        # Find the products with the matching product IDs, or the products names or near-misses refer to
+        product1 = catalog.resolve(product_id_1)
+        product2 = catalog.resolve(product_id_2)
         
         errors = []
+        suggestions: List[Dict[str, str]] = []
         if not product1:
             errors.append(f"No {PRODUCT_TYPE} item found with product ID: {product_id_1}")
+            suggestions.extend(catalog.suggest(product_id_1))
         if not product2:
             errors.append(f"No {PRODUCT_TYPE} item found with product ID: {product_id_2}")
+            suggestions.extend(s for s in catalog.suggest(product_id_2) if s not in suggestions)
         
-        if errors:
+        if errors or product1 is None or product2 is None:
             return {
                 "error": ". ".join(errors),
-                "available_ids": [p["product_id"] for p in products]
+                "suggestions": suggestions
             }
         
-        # Check if images exist for these products
-        image_path1 = IMAGES_DIR / f"{product_id_1}.jpg"
-        image_path2 = IMAGES_DIR / f"{product_id_2}.jpg"
-        has_image1 = image_path1.exists()
-        has_image2 = image_path2.exists()
-        
-        # Load marketing content for both products
-        marketing_content1 = load_marketing_content(product_id_1)
-        marketing_content2 = load_marketing_content(product_id_2)
+        # Image info and marketing content for both products, usually prefetched
+        # while the tool call was streamed
+        assets1 = get_product_assets(product1["product_id"])
+        assets2 = get_product_assets(product2["product_id"])
         
         # Prepare comparison data
         comparison_data = {
-            "product1": {
-                **product1,
-                "has_image": has_image1,
-                "image_url": f"{PRODUCT_IMAGES_ENDPOINT}/{product_id_1}" if has_image1 else None,
-                "marketing_content": marketing_content1
-            },
-            "product2": {
-                **product2,
-                "has_image": has_image2,
-                "image_url": f"{PRODUCT_IMAGES_ENDPOINT}/{product_id_2}" if has_image2 else None,
-                "marketing_content": marketing_content2
-            },
+            "product1": {**project_product(product1, "product-comparison"), **assets1},
+            "product2": {**project_product(product2, "product-comparison"), **assets2},
             "description": description
         }
         
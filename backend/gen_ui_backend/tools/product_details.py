@@ -1,12 +1,14 @@
 import os
-import csv
 from typing import Optional
 from pathlib import Path
 
 from langchain.pydantic_v1 import BaseModel, Field
 from langchain_core.tools import tool
 
-from gen_ui_backend.config import CATALOG_PATH, IMAGES_DIR, PRODUCT_IMAGES_ENDPOINT, PRODUCT_TYPE, load_marketing_content
+from gen_ui_backend.catalog import get_catalog_index
+from gen_ui_backend.config import PRODUCT_TYPE
+from gen_ui_backend.prefetch import get_product_assets
+from gen_ui_backend.tools.payloads import project_product
 
 
 class ProductDetailsInput(BaseModel):
@@ -17,35 +19,28 @@ class ProductDetailsInput(BaseModel):
 @tool("product-details", args_schema=ProductDetailsInput, return_direct=True)
 def product_details(product_id: str, description: str = "") -> dict:
     """Get details about a product from the catalog based on its product ID."""
-    # Load the product data from the CSV file
     try:
-        with open(CATALOG_PATH, 'r') as file:
-            reader = csv.DictReader(file)
-            products = list(reader)
+        catalog = get_catalog_index()
         
-        # Find the product with the matching product ID
-        product = next((p for p in products if p["product_id"] == product_id), None)
+        # Find the product with the matching product ID, or the product a name or near-miss refers to
+        product = catalog.resolve(product_id)
         
         if not product:
             return {
                 "error": f"No {PRODUCT_TYPE} item found with product ID: {product_id}",
-                "available_ids": [p["product_id"] for p in products]
+                "suggestions": catalog.suggest(product_id)
             }
         
-        # Check if an image exists for this product
-        image_path = IMAGES_DIR / f"{product_id}.jpg"
-        has_image = image_path.exists()
-        
-        # Load marketing content if available
-        marketing_content = load_marketing_content(product_id)
+        # Image info and marketing content, usually prefetched while the tool call was streamed
+        assets = get_product_assets(product["product_id"])
         
         # Return the product data with image info and marketing content
         return {
-            **product,
-            "has_image": has_image,
-            "image_url": f"{PRODUCT_IMAGES_ENDPOINT}/{product_id}" if has_image else None,
+            **project_product(product, "product-details"),
+            "has_image": assets["has_image"],
+            "image_url": assets["image_url"],
             "description": description,
-            "marketing_content": marketing_content
+            "marketing_content": assets["marketing_content"]
         }
     
     except Exception as e:
@@ -1,64 +1,90 @@
 import os
-import csv
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from pathlib import Path
 
 from langchain.pydantic_v1 import BaseModel, Field
 from langchain_core.tools import tool
 
-from gen_ui_backend.config import CATALOG_PATH, IMAGES_DIR, PRODUCT_IMAGES_ENDPOINT, PRODUCT_TYPE
+from gen_ui_backend.catalog import get_catalog_index
+from gen_ui_backend.config import MAX_NOT_FOUND_SUGGESTIONS, MAX_TILES_PER_PAGE, PRODUCT_TYPE
+from gen_ui_backend.prefetch import get_product_assets
+from gen_ui_backend.tools.payloads import project_product
 
 
 class ProductTilesInput(BaseModel):
     product_ids: List[str] = Field(..., description=f"A list of product IDs to display as tiles")
     title: str = Field(default="Recommended Products", description=f"Optional title for the {PRODUCT_TYPE} tiles section")
     description: str = Field(default="", description=f"Optional generative content to display with the {PRODUCT_TYPE} tiles, based on the conversation context")
+    page: int = Field(default=1, description=f"Page of tiles to display, {MAX_TILES_PER_PAGE} {PRODUCT_TYPE} items per page")
 
 
 @tool("product-tiles", args_schema=ProductTilesInput, return_direct=True)
-def product_tiles(product_ids: List[str], title: str = "Recommended Products", description: str = "") -> dict:
+def product_tiles(product_ids: List[str], title: str = "Recommended Products", description: str = "", page: int = 1) -> dict:
     """Display multiple products as tiles with basic information."""
     try:
-        with open(CATALOG_PATH, 'r') as file:
-            reader = csv.DictReader(file)
-            all_products = list(reader)
+        catalog = get_catalog_index()
+        
+        # Only one page of tiles is returned, the rest can be requested with `page`
+        product_ids = list(dict.fromkeys(product_ids))
+        total_pages = max(1, -(-len(product_ids) // MAX_TILES_PER_PAGE))
+        page = min(max(1, page), total_pages)
+        page_ids = product_ids[(page - 1) * MAX_TILES_PER_PAGE:page * MAX_TILES_PER_PAGE]
         
         # Find the products with the matching product IDs
-        found_products = []
+        found_products: List[Dict[str, Any]] = []
         not_found_ids = []
+        substituted_ids = []
+        merged_ids = []
         
-        for product_id in product_ids:
-            product = next((p for p in all_products if p["product_id"] == product_id), None)
+        for product_id in page_ids:
+            # A name or near-miss resolves to its product, which may already be on the page
+            product = catalog.resolve(product_id)
+            if product and product["product_id"] != product_id:
+                substituted_ids.append(f"{product_id} -> {product['product_id']}")
+            if product and any(p["product_id"] == product["product_id"] for p in found_products):
+                merged_ids.append(product_id)
+                continue
             if product:
-                # Check if an image exists for this product
-                image_path = IMAGES_DIR / f"{product_id}.jpg"
-                has_image = image_path.exists()
+                # Image info, usually prefetched while the tool call was streamed
+                assets = get_product_assets(product["product_id"])
                 
                 # Add product data to results
                 product_with_image = {
-                    **product,
-                    "has_image": has_image,
-                    "image_url": f"{PRODUCT_IMAGES_ENDPOINT}/{product_id}" if has_image else None
+                    **project_product(product, "product-tiles"),
+                    "has_image": assets["has_image"],
+                    "image_url": assets["image_url"]
                 }
                 found_products.append(product_with_image)
             else:
                 not_found_ids.append(product_id)
         
         if not found_products:
+            suggestions: List[Dict[str, str]] = []
+            for product_id in not_found_ids:
+                suggestions.extend(s for s in catalog.suggest(product_id) if s not in suggestions)
             return {
-                "error": f"No {PRODUCT_TYPE} found with the provided product IDs: {', '.join(product_ids)}",
-                "available_ids": [p["product_id"] for p in all_products]
+                "error": f"No {PRODUCT_TYPE} found with the provided product IDs: {', '.join(page_ids)}",
+                "suggestions": suggestions[:MAX_NOT_FOUND_SUGGESTIONS]
             }
         
         # Return the data
         result = {
             "title": title,
             "products": found_products,
-            "description": description
+            "description": description,
+            "page": page,
+            "total_pages": total_pages
         }
         
+        warnings = []
         if not_found_ids:
-            result["warning"] = f"Some product IDs were not found: {', '.join(not_found_ids)}"
+            warnings.append(f"Some product IDs were not found: {', '.join(not_found_ids)}")
+        if substituted_ids:
+            warnings.append(f"Some product IDs were resolved to other IDs: {', '.join(substituted_ids)}")
+        if merged_ids:
+            warnings.append(f"Some product IDs were already shown and were skipped: {', '.join(merged_ids)}")
+        if warnings:
+            result["warning"] = ". ".join(warnings)
             
         return result
     
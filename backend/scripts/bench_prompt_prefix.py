@@ -0,0 +1,126 @@
+"""
+Benchmark the prompt layout for provider-side prefix caching.
+
+Runs several turns through the graph with a stub chat model that records every
+request, then checks that:
+- the system message is byte-identical across turns
+- each `invoke_model` request starts with the complete previous one
+- the instructions and catalog are identical for users with different profiles
+
+It also reports the share of prompt characters that a prefix cache could reuse.
+
+Usage: python scripts/bench_prompt_prefix.py [--turns 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Every prompt received by the stub model, in order
+REQUESTS: List[List[BaseMessage]] = []
+
+
+class StubChatModel(BaseChatModel):
+    """Records the prompts it receives and alternates text answers with tool calls."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "StubChatModel":
+        return self
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        REQUESTS.append(list(messages))
+        turn = len(REQUESTS)
+        if turn % 3 == 1:
+            message = AIMessage(
+                content="",
+                tool_calls=[{"name": "product-tiles", "args": {"product_ids": ["1", "2", "3"]}, "id": f"call_{turn}"}],
+            )
+        else:
+            message = AIMessage(content=f"Stub answer {turn}")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _serialize(messages: List[BaseMessage]) -> str:
+    return "".join(f"<{message.type}>{message.content}" for message in messages)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ["GENUI_STORE_DIR"] = tempfile.mkdtemp(prefix="genui-bench-")
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    from gen_ui_backend import chain
+    from gen_ui_backend.catalog import get_catalog
+    from gen_ui_backend.config import build_system_prompt
+    from gen_ui_backend.history import reset_chat_history
+
+    chain.create_chat_model = StubChatModel  # type: ignore[assignment]
+    graph = chain.create_graph()
+    reset_chat_history("bench")
+
+    invoke_model_requests = []
+    started = time.perf_counter()
+    for turn in range(args.turns):
+        before = len(REQUESTS)
+        graph.invoke(
+            {"input": [HumanMessage(content=f"Turn {turn}: show me something light for coding")]},
+            {"configurable": {"session_id": "bench"}},
+        )
+        invoke_model_requests.append(REQUESTS[before])
+    elapsed = time.perf_counter() - started
+
+    failures = []
+    system_prompts = {request[0].content for request in invoke_model_requests}
+    if len(system_prompts) != 1:
+        failures.append(f"system prompt changed across turns ({len(system_prompts)} variants)")
+
+    reused = total = 0
+    for previous, current in zip(invoke_model_requests, invoke_model_requests[1:]):
+        previous_text, current_text = _serialize(previous), _serialize(current)
+        if current[:len(previous)] != previous:
+            failures.append("a request does not start with the previous request")
+            break
+        reused += len(previous_text)
+        total += len(current_text)
+
+    catalog = get_catalog().prompt_text
+    first_user = build_system_prompt(catalog, "Name: A\nPrefers gaming laptops")
+    second_user = build_system_prompt(catalog, "Name: B\nPrefers ultrabooks")
+    shared_prefix = os.path.commonprefix([first_user, second_user])
+    if catalog not in shared_prefix:
+        failures.append("instructions and catalog are not shared between users")
+
+    print(f"Turns: {args.turns}, model requests: {len(REQUESTS)}, graph time: {elapsed * 1000:.1f} ms")
+    print(f"Prompt prefix reusable from the previous turn: {reused / max(total, 1):.1%}")
+    print(f"System prompt prefix shared between users: {len(shared_prefix) / len(first_user):.1%}")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        return 1
+    print("OK: prompt prefix is stable across turns and users")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+    sys.exit(main())
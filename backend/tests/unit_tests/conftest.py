@@ -0,0 +1,22 @@
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from gen_ui_backend import config, history
+from gen_ui_backend.store import BaseStore
+
+
+@pytest.fixture
+def store(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[BaseStore]:
+    """File store in a scratch directory, returned by `get_store()` for the duration of a test."""
+    # Also set for worker processes that import the backend again
+    monkeypatch.setenv("GENUI_STORE", "file")
+    monkeypatch.setenv("GENUI_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "STORE_BACKEND", "file")
+    monkeypatch.setattr(config, "STORE_DIR", tmp_path)
+    config.get_store.cache_clear()
+    history._history_cache.clear()
+    yield config.get_store()
+    config.get_store.cache_clear()
+    history._history_cache.clear()
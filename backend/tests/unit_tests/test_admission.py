@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from gen_ui_backend.admission import AdmissionController, AdmissionRejected
+
+
+def _controller(max_queue: int = 1, queue_timeout: float = 1.0) -> AdmissionController:
+    return AdmissionController(max_concurrency=1, max_queue=max_queue, queue_timeout=queue_timeout, retry_after=3)
+
+
+async def test_admits_up_to_max_concurrency() -> None:
+    controller = _controller()
+    await controller.acquire()
+    assert controller.in_flight == 1
+    controller.release()
+    assert controller.in_flight == 0
+
+
+async def test_rejects_with_429_when_queue_is_full() -> None:
+    controller = _controller(max_queue=1)
+    await controller.acquire()
+    queued = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire()
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after == 3
+
+    # The queued request gets the slot when it is released
+    controller.release()
+    await asyncio.wait_for(queued, timeout=1)
+    assert controller.in_flight == 1
+
+
+async def test_rejects_with_503_after_queue_timeout() -> None:
+    controller = _controller(queue_timeout=0.01)
+    await controller.acquire()
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire()
+    assert rejected.value.status_code == 503
+    assert controller.in_flight == 1
+    assert not controller._waiters
+
+
+async def test_cancelled_waiter_leaves_the_queue() -> None:
+    controller = _controller(max_queue=1)
+    await controller.acquire()
+    queued = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    assert not controller._waiters
+
+    # The freed queue place and slot can be used again
+    controller.release()
+    assert controller.in_flight == 0
+    await asyncio.wait_for(controller.acquire(), timeout=1)
+    assert controller.in_flight == 1
+
+
+async def test_release_hands_slots_over_in_fifo_order() -> None:
+    controller = _controller(max_queue=2)
+    await controller.acquire()
+    first = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+    second = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+
+    controller.release()
+    await asyncio.wait_for(first, timeout=1)
+    assert not second.done()
+    assert controller.in_flight == 1
+
+    controller.release()
+    await asyncio.wait_for(second, timeout=1)
+    controller.release()
+    assert controller.in_flight == 0
+
+
+async def test_cancelled_waiter_does_not_leak_a_handed_over_slot() -> None:
+    controller = _controller(max_queue=2)
+    await controller.acquire()
+    first = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+    second = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+
+    # The slot is handed to `first`, whose client goes away before it resumes
+    controller.release()
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    if first.cancelled():
+        # The slot was passed on to the next waiter
+        assert second.done()
+    else:
+        # Some Python versions complete the wait instead, and `first` holds the slot
+        assert not second.done()
+        controller.release()
+        await asyncio.wait_for(second, timeout=1)
+    assert controller.in_flight == 1
+    controller.release()
+    assert controller.in_flight == 0
@@ -0,0 +1,119 @@
+import os
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from gen_ui_backend import archive
+from gen_ui_backend.history import (
+    append_turn_to_chat_history,
+    load_chat_history,
+    reset_chat_history,
+)
+from gen_ui_backend.store import BaseStore
+
+
+def _rows(text: str) -> List[List[str]]:
+    return [["ai", "Welcome!"], ["human", text], ["ai", f"answer to {text}"]]
+
+
+@pytest.fixture
+def archive_dir(store: BaseStore, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Empty archive with the default size and age limits, read without index state of other tests."""
+    path = tmp_path / "archive"
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", path)
+    monkeypatch.setattr(archive, "_index", {})
+    monkeypatch.setattr(archive, "_index_cursor", None)
+    return path
+
+
+def _archived_rows(session_id: str, position: int = -1) -> Optional[List[List[str]]]:
+    archived = archive.load_archived_session(session_id, position)
+    return archived["rows"] if archived is not None else None
+
+
+def _segment_numbers() -> List[int]:
+    return [number for number, _ in archive._segments()]
+
+
+def test_nothing_archived(archive_dir: Path) -> None:
+    assert archive.list_archived_sessions("s1") == []
+    assert archive.load_archived_session("s1") is None
+
+
+def test_write_and_lookup(archive_dir: Path) -> None:
+    archive.archive_session("s1", _rows("first"))
+    archive.archive_session("s2", _rows("other"))
+    archive.archive_session("s1", _rows("second"))
+
+    entries = archive.list_archived_sessions("s1")
+    assert [entry["messages"] for entry in entries] == [3, 3]
+    assert _archived_rows("s1") == _rows("second")
+    assert _archived_rows("s1", position=0) == _rows("first")
+    assert _archived_rows("s2") == _rows("other")
+    assert archive.load_archived_session("s1", position=2) is None
+    assert archive.load_archived_session("unknown") is None
+
+
+def test_new_segment_when_full(archive_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(archive, "ARCHIVE_SEGMENT_BYTES", 1)
+    for text in ("one", "two", "three"):
+        archive.archive_session("s1", _rows(text))
+
+    assert _segment_numbers() == [1, 2, 3]
+    assert [entry["segment"] for entry in archive.list_archived_sessions("s1")] == [1, 2, 3]
+    assert _archived_rows("s1", position=1) == _rows("two")
+
+
+def test_prune_by_size(archive_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(archive, "ARCHIVE_SEGMENT_BYTES", 1)
+    entry = archive.archive_session("s1", _rows("one"))
+    # Room for about two segments
+    monkeypatch.setattr(archive, "ARCHIVE_MAX_BYTES", entry["length"] * 2 + 10)
+    # Read the index before it is rewritten by the prune
+    assert len(archive.list_archived_sessions("s1")) == 1
+
+    for text in ("two", "three", "four"):
+        archive.archive_session("s1", _rows(text))
+
+    assert _segment_numbers() == [3, 4]
+    assert [entry["segment"] for entry in archive.list_archived_sessions("s1")] == [3, 4]
+    assert _archived_rows("s1", position=0) == _rows("three")
+
+
+def test_prune_by_age(archive_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(archive, "ARCHIVE_SEGMENT_BYTES", 1)
+    monkeypatch.setattr(archive, "ARCHIVE_RETENTION_DAYS", 1)
+    archive.archive_session("old", _rows("old"))
+    old_time = time.time() - 2 * 86400
+    os.utime(archive._segment_path(1), (old_time, old_time))
+
+    archive.archive_session("new", _rows("new"))
+
+    assert _segment_numbers() == [2]
+    assert archive.load_archived_session("old") is None
+    assert _archived_rows("new") == _rows("new")
+
+
+def test_current_segment_is_never_pruned(archive_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(archive, "ARCHIVE_MAX_BYTES", 1)
+    archive.archive_session("s1", _rows("one"))
+    archive.archive_session("s1", _rows("two"))
+
+    assert _segment_numbers() == [1]
+    assert len(archive.list_archived_sessions("s1")) == 2
+
+
+def test_reset_archives_the_conversation(archive_dir: Path) -> None:
+    load_chat_history("s1")
+    append_turn_to_chat_history([["human", "hi"], ["ai", "hello"]], "s1")
+
+    reset_chat_history("s1")
+
+    archived = archive.load_archived_session("s1")
+    assert archived is not None
+    assert archived["rows"][1:] == [["human", "hi"], ["ai", "hello"]]
+    # Nothing to archive in a conversation without turns
+    reset_chat_history("s1")
+    assert len(archive.list_archived_sessions("s1")) == 1
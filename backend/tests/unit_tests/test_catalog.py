@@ -0,0 +1,72 @@
+from typing import Dict, List
+
+import pytest
+
+from gen_ui_backend.catalog import CatalogIndex
+
+PRODUCTS: List[Dict[str, str]] = [
+    {"product_id": "1", "name": "MacBook Air 13 (M3)", "brand": "Apple", "cpu_family": "M3"},
+    {"product_id": "2", "name": "MacBook Pro 14 (M3 Pro)", "brand": "Apple", "cpu_family": "M3 Pro"},
+    {"product_id": "3", "name": "Razer Blade 15", "brand": "Razer", "cpu_family": "Intel Core i7"},
+    {"product_id": "LT-12", "name": "ThinkPad X1 Carbon Gen 12", "brand": "Lenovo", "cpu_family": "Intel Core Ultra 7"},
+]
+
+
+@pytest.fixture
+def index() -> CatalogIndex:
+    return CatalogIndex(PRODUCTS)
+
+
+@pytest.mark.parametrize(
+    "query, product_id",
+    [
+        ("3", "3"),
+        ("LT-12", "LT-12"),
+        # Different case or punctuation
+        ("lt 12", "LT-12"),
+        ("#3", "3"),
+        # Names, with or without the brand
+        ("Razer Blade 15", "3"),
+        ("razer blade", "3"),
+        ("Lenovo ThinkPad X1 Carbon Gen 12", "LT-12"),
+        ("MacBook Air 13", "1"),
+        # Near-misses
+        ("Razr Blade 15", "3"),
+        ("Thinkpad X1 Carbn", "LT-12"),
+    ],
+)
+def test_resolve(index: CatalogIndex, query: str, product_id: str) -> None:
+    product = index.resolve(query)
+    assert product is not None
+    assert product["product_id"] == product_id
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        # Unknown IDs never match a name containing the number
+        "15",
+        "#13",
+        # Ambiguous between the two MacBooks
+        "MacBook",
+        "Apple",
+        "Dell XPS 13",
+        "",
+    ],
+)
+def test_resolve_unknown_or_ambiguous(index: CatalogIndex, query: str) -> None:
+    assert index.resolve(query) is None
+
+
+def test_suggest_closest_products(index: CatalogIndex) -> None:
+    suggestions = index.suggest("MacBook")
+    assert {s["product_id"] for s in suggestions} == {"1", "2"}
+    assert all(s["name"].startswith("MacBook") for s in suggestions)
+
+
+def test_suggest_respects_limit(index: CatalogIndex) -> None:
+    assert len(index.suggest("MacBook", limit=1)) == 1
+
+
+def test_suggest_nothing_for_unrelated_query(index: CatalogIndex) -> None:
+    assert index.suggest("zzzz qqqq") == []
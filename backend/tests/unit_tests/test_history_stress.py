@@ -0,0 +1,88 @@
+"""
+Concurrent chat history writes.
+
+Several processes, each with several threads, append whole turns to the same
+session while a reader keeps loading it. At the end every turn must be present
+exactly once, with its rows contiguous and unmodified.
+"""
+import multiprocessing
+import threading
+from typing import Any, List
+
+from gen_ui_backend.history import (
+    INITIAL_HISTORY_ROWS,
+    append_turn_to_chat_history,
+    get_history_key,
+    reset_chat_history,
+)
+from gen_ui_backend.store import BaseStore
+
+SESSION_ID = "stress"
+PROCESSES = 2
+THREADS = 3
+TURNS = 10
+
+
+def _turn_rows(writer: str, turn: int) -> List[List[str]]:
+    # Multi-line content with quotes and commas exercises CSV quoting
+    return [
+        ["human", f"{writer} turn {turn}: question, with \"quotes\"\nand a second line"],
+        ["ai", f"{writer} turn {turn}: Tool Calls: [{{'type': 'product-tiles'}}]"],
+        ["ai", f"{writer} turn {turn}: final answer\n\n- bullet"],
+    ]
+
+
+def _write_turns(process_index: int) -> None:
+    def worker(thread_index: int) -> None:
+        writer = f"p{process_index}t{thread_index}"
+        for turn in range(TURNS):
+            append_turn_to_chat_history(_turn_rows(writer, turn), SESSION_ID)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+
+def _read_until(done: Any) -> None:
+    from gen_ui_backend.config import get_store
+
+    store = get_store()
+    key = get_history_key(SESSION_ID)
+    while not done.is_set():
+        for row in store.read_rows(key):
+            if len(row) != 2:
+                raise AssertionError(f"Torn row read during writes: {row!r}")
+
+
+def test_concurrent_turns_are_written_whole_and_once(store: BaseStore) -> None:
+    reset_chat_history(SESSION_ID)
+
+    done = multiprocessing.Event()
+    reader = multiprocessing.Process(target=_read_until, args=(done,))
+    reader.start()
+    writers = [multiprocessing.Process(target=_write_turns, args=(i,)) for i in range(PROCESSES)]
+    for process in writers:
+        process.start()
+    for process in writers:
+        process.join()
+    done.set()
+    reader.join()
+
+    assert [process.exitcode for process in writers + [reader]] == [0] * (PROCESSES + 1)
+
+    rows = store.read_rows(get_history_key(SESSION_ID))
+    assert rows[:2] == INITIAL_HISTORY_ROWS
+
+    body = rows[2:]
+    seen = set()
+    for start in range(0, len(body), 3):
+        turn = body[start:start + 3]
+        writer, rest = turn[0][1].split(" turn ", 1)
+        number = int(rest.split(":")[0])
+        assert turn == _turn_rows(writer, number), f"turn {writer}/{number} is interleaved or modified"
+        assert (writer, number) not in seen, f"turn {writer}/{number} written twice"
+        seen.add((writer, number))
+
+    assert len(seen) == PROCESSES * THREADS * TURNS
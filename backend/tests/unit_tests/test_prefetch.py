@@ -0,0 +1,30 @@
+from typing import List
+
+import pytest
+
+from gen_ui_backend.prefetch import complete_product_ids
+
+
+@pytest.mark.parametrize(
+    "raw_args, product_ids",
+    [
+        ("", []),
+        ('{"product_ids": [', []),
+        # The last ID may still be streaming
+        ('{"product_ids": ["1", "4", "1', ["1", "4"]),
+        ('{"product_ids": ["1", "4"', ["1", "4"]),
+        ('{"product_ids": ["1", "4"], "page": 1}', ["1", "4"]),
+        ('{"product_ids": [1, 2', ["1"]),
+        ('{"product_ids": [1, 2]}', ["1", "2"]),
+        ('{"product_id": "12', []),
+        ('{"product_id": "12"', ["12"]),
+        ('{"product_id": 7', []),
+        ('{"product_id": 7}', ["7"]),
+        ('{"product_id_1": "3", "product_id_2": "5', ["3"]),
+        ('{"product_id_1": "3", "product_id_2": "5"}', ["3", "5"]),
+        # Product IDs mentioned in other arguments are not arguments
+        ('{"description": "compare product_id 3', []),
+    ],
+)
+def test_complete_product_ids(raw_args: str, product_ids: List[str]) -> None:
+    assert complete_product_ids(raw_args) == product_ids
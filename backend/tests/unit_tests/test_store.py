@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import pytest
+
+from gen_ui_backend.store import BaseStore, FileStore, LocalRedis, RedisStore
+
+KEY = "history/session.csv"
+HEADERS = ["role", "content"]
+
+
+@pytest.fixture(params=["file", "redis"])
+def row_store(request: pytest.FixtureRequest, tmp_path: Path) -> BaseStore:
+    if request.param == "file":
+        return FileStore(tmp_path)
+    return RedisStore(LocalRedis())
+
+
+def test_missing_rows_have_no_cursor(row_store: BaseStore) -> None:
+    assert row_store.cursor(KEY) is None
+    assert row_store.read_rows_since(KEY) == ([], None)
+
+
+def test_read_since_cursor_returns_appended_rows(row_store: BaseStore) -> None:
+    row_store.append_rows(KEY, [HEADERS, ["ai", "Welcome!"]])
+    rows, cursor = row_store.read_rows_since(KEY)
+    assert rows == [HEADERS, ["ai", "Welcome!"]]
+    assert cursor == row_store.cursor(KEY)
+
+    row_store.append_rows(KEY, [["human", "hi,\n\"there\""], ["ai", "hello"]])
+    rows, new_cursor = row_store.read_rows_since(KEY, cursor)
+    assert rows == [["human", "hi,\n\"there\""], ["ai", "hello"]]
+    assert new_cursor == row_store.cursor(KEY)
+
+    # Nothing new since the latest cursor
+    assert row_store.read_rows_since(KEY, new_cursor) == ([], new_cursor)
+
+
+def test_rewrite_invalidates_cursor(row_store: BaseStore) -> None:
+    row_store.append_rows(KEY, [HEADERS, ["ai", "one"], ["human", "two"]])
+    cursor = row_store.cursor(KEY)
+
+    # Same number of rows and bytes, so only the generation tells the rewrite apart
+    row_store.write_rows(KEY, [HEADERS, ["ai", "uno"], ["human", "dos"]])
+    assert row_store.cursor(KEY) != cursor
+    rows, _ = row_store.read_rows_since(KEY, cursor)
+    assert rows == [HEADERS, ["ai", "uno"], ["human", "dos"]]
+
+
+def test_rewrite_with_more_rows_is_read_from_the_start(row_store: BaseStore) -> None:
+    row_store.append_rows(KEY, [HEADERS, ["ai", "Welcome!"]])
+    cursor = row_store.cursor(KEY)
+
+    row_store.write_rows(KEY, [HEADERS, ["ai", "Welcome!"], ["human", "hi"], ["ai", "hello"]])
+    rows, _ = row_store.read_rows_since(KEY, cursor)
+    assert rows == [HEADERS, ["ai", "Welcome!"], ["human", "hi"], ["ai", "hello"]]
+
+
+def test_delete_and_recreate_invalidates_cursor(row_store: BaseStore) -> None:
+    row_store.append_rows(KEY, [HEADERS, ["ai", "one"]])
+    cursor = row_store.cursor(KEY)
+
+    row_store.delete(KEY)
+    assert row_store.cursor(KEY) is None
+    row_store.append_rows(KEY, [HEADERS, ["ai", "two"]])
+    assert row_store.cursor(KEY) != cursor
+    rows, _ = row_store.read_rows_since(KEY, cursor)
+    assert rows == [HEADERS, ["ai", "two"]]